@@ -4,12 +4,14 @@ def main():
     conn = sqlite3.connect("reviews.db")
     cur = conn.cursor()
 
-    cur.execute("SELECT COUNT(*) FROM reviews;")
+    # the rollups are maintained on insert, so these read them instead of scanning reviews;
+    # the daily cells include undated reviews (day = '')
+    cur.execute("SELECT IFNULL(SUM(review_count), 0) FROM review_daily_stats;")
     print("Total reviews:", cur.fetchone()[0])
 
     cur.execute("""
-        SELECT year_month, AVG(rating), COUNT(*)
-        FROM reviews
+        SELECT year_month, SUM(rating_sum) * 1.0 / NULLIF(SUM(rating_count), 0), SUM(review_count)
+        FROM review_monthly_stats
         GROUP BY year_month
         ORDER BY year_month
         LIMIT 5;
@@ -21,4 +23,3 @@ def main():
 
 if __name__ == "__main__":
     main()
- 
\ No newline at end of file
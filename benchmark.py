@@ -0,0 +1,262 @@
+"""Offline throughput benchmark for the review pipeline.
+
+``gps.reviews`` is replaced by a seeded synthetic store, so runs are
+deterministic and never touch the network. Each scenario runs in its own
+process and reports rows/s, peak RSS and per-stage timings as JSON lines
+that can be compared between commits.
+
+    python3 benchmark.py --sizes 10000,1000000,10000000 --output bench.jsonl
+"""
+from __future__ import annotations
+
+import argparse
+import contextlib
+import io
+import json
+import math
+import multiprocessing
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from functools import wraps
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+CURRENT_DIR = Path(__file__).resolve().parent
+
+SCENARIOS = ("single", "schedule", "periodic", "sqlite")
+NOW = datetime(2025, 11, 18, 0, 0, 0)
+PAGE_SIZE = 1000
+
+_WORDS = (
+    "good app great useful amazing bad slow crash login voice chat answer helpful love "
+    "update subscription error fast best nice très bien gut sehr schön bueno muy útil "
+    "很好 非常 有用 とても 便利 좋아요 отлично полезно 👍 🔥 ❤️ 😡"
+).split()
+_VERSIONS = ("1.2025.301", "1.2025.294", "1.2025.287", "1.2025.280", None)
+_SCORES = (1, 2, 3, 4, 5)
+_SCORE_WEIGHTS = (8, 2, 3, 7, 80)
+
+
+class FakeToken:
+    """Stand-in for ``gps``'s continuation token; the runners update ``count`` in place."""
+
+    def __init__(self, token: Optional[str], count: int) -> None:
+        self.token = token
+        self.count = count
+
+
+class FakePlayStore:
+    """Deterministic newest-first review stream with a daily activity cycle.
+
+    Reviews arrive ``reviews_per_day`` times a day on average, more often in
+    the evening than at night; content length follows a log-normal word count
+    drawn from a mixed-script vocabulary.
+    """
+
+    def __init__(self, seed: int, reviews_per_day: float, total: int) -> None:
+        self.seed = seed
+        self.reviews_per_day = reviews_per_day
+        self.total = total
+        self.calls = 0
+        self.rows = 0
+        self.generate_seconds = 0.0
+
+    def reviews(self, app_id: str, lang: str = "en", country: str = "us", sort=None, count: int = 100, continuation_token=None, **_):
+        started = time.perf_counter()
+        self.calls += 1
+        if continuation_token is not None:
+            if continuation_token.token is None:
+                return [], continuation_token
+            index, seconds = (int(part) for part in continuation_token.token.split(":"))
+            count = continuation_token.count
+        else:
+            index, seconds = 0, 0
+        rng = random.Random(f"{self.seed}:{app_id}:{index}")
+        mean_gap = 86400.0 / self.reviews_per_day
+        rows: List[Dict] = []
+        end = min(self.total, index + count)
+        for position in range(index, end):
+            at = NOW - timedelta(seconds=seconds)
+            # quieter at night, busier in the evening
+            activity = 1.0 + 0.6 * math.sin((at.hour - 9) / 24 * 2 * math.pi)
+            seconds += max(1, int(rng.expovariate(activity / mean_gap)))
+            words = max(1, int(rng.lognormvariate(1.8, 0.9)))
+            rows.append(
+                {
+                    "reviewId": f"{app_id}-{position}",
+                    "userName": f"user{rng.randrange(10 ** 6)}",
+                    "content": " ".join(rng.choice(_WORDS) for _ in range(words)),
+                    "score": rng.choices(_SCORES, _SCORE_WEIGHTS)[0],
+                    "at": at,
+                    "appVersion": rng.choice(_VERSIONS),
+                }
+            )
+        token = f"{end}:{seconds}" if end < self.total else None
+        self.rows += len(rows)
+        self.generate_seconds += time.perf_counter() - started
+        return rows, FakeToken(token, count)
+
+
+def _peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # bytes on macOS, kilobytes elsewhere
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def _timed(stages: Dict[str, float], name: str, fn: Callable) -> Callable:
+    @wraps(fn)
+    def wrapper(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            stages[name] += time.perf_counter() - started
+
+    return wrapper
+
+
+def _run_scenario(scenario: str, size: int, seed: int) -> Dict:
+    import load_reviews
+    import pipeline
+    import run_from_config
+    import run_periodic
+    import scraper
+    import sinks
+    from records import Review
+
+    pages = math.ceil(size / PAGE_SIZE)
+    days = {"single": 30, "schedule": 365, "periodic": 8, "sqlite": 30}[scenario]
+    store = FakePlayStore(seed, reviews_per_day=size / days, total=size)
+    scraper.reviews = store.reviews
+
+    stages: Dict[str, float] = defaultdict(float)
+    for module, name, stage in (
+        (scraper, "reviews", "fetch"),
+        (pipeline, "bucket_rows_by_period", "bucket"),
+        (pipeline, "filter_rows_by_period", "filter"),
+        (sinks, "save_to_csv", "write_csv"),
+    ):
+        setattr(module, name, _timed(stages, stage, getattr(module, name)))
+
+    rows_out = None
+    with tempfile.TemporaryDirectory() as tmp:
+        output = Path(tmp)
+        started = time.perf_counter()
+        if scenario == "single":
+            app_cfg = {"package": "bench.app", "count": PAGE_SIZE, "max_pages": pages}
+            run_from_config.run_single(app_cfg, output, "en", "us")
+        elif scenario == "schedule":
+            end = NOW.date() - timedelta(days=1)
+            app_cfg = {
+                "package": "bench.app",
+                "frequency": "daily",
+                "count": PAGE_SIZE,
+                "auto_count_cap": PAGE_SIZE,
+                "auto_pages_cap": pages + 1,
+                "start_date": f"{end - timedelta(days=days - 2):%Y-%m-%d}",
+                "end_date": f"{end:%Y-%m-%d}",
+            }
+            run_from_config.run_schedule(app_cfg, output, "en", "us")
+        elif scenario == "periodic":
+            app_cfg = {"package": "bench.app", "frequency": "monthly", "count": PAGE_SIZE, "max_pages": pages + 1}
+            # the stream's 8 days all fall in the month of NOW - 1 day, so every page is read and every row written
+            run_periodic.run_periodic_app(app_cfg, output, "en", "us", NOW.date() - timedelta(days=1))
+        else:
+            rows = [
+                Review(data["userName"], data["content"], data["score"], data["at"], data["appVersion"])
+                for page in _pages(store, pages)
+                for data in page
+            ]
+            csv_path = output / "bench.app_merged.csv"
+            sinks.save_to_csv(rows, csv_path)
+            del rows
+            load_started = time.perf_counter()
+            # load() reports progress on stdout, which carries the JSON lines
+            with contextlib.redirect_stdout(io.StringIO()):
+                rows_out = load_reviews.load(csv_path, output / "reviews.db", package="bench.app")
+            stages["sqlite_load"] = time.perf_counter() - load_started
+        wall = time.perf_counter() - started
+
+    stages["generate"] = store.generate_seconds
+    if rows_out is None:
+        rows_out = store.rows
+    return {
+        "scenario": scenario,
+        "size": size,
+        "seed": seed,
+        "rows": rows_out,
+        "requests": store.calls,
+        "seconds": round(wall, 4),
+        "rows_per_second": round(rows_out / wall, 1) if wall else None,
+        "peak_rss_mb": round(_peak_rss_mb(), 1),
+        "stages": {name: round(value, 4) for name, value in sorted(stages.items())},
+    }
+
+
+def _pages(store: FakePlayStore, pages: int):
+    token = None
+    for _ in range(pages):
+        rows, token = store.reviews("bench.app", count=PAGE_SIZE, continuation_token=token)
+        yield rows
+        if token.token is None:
+            break
+
+
+def _child(queue, scenario: str, size: int, seed: int) -> None:
+    queue.put(_run_scenario(scenario, size, seed))
+
+
+def run_isolated(scenario: str, size: int, seed: int) -> Dict:
+    """Run one scenario in a fresh process so its peak RSS is its own."""
+    ctx = multiprocessing.get_context("spawn")
+    queue = ctx.Queue()
+    process = ctx.Process(target=_child, args=(queue, scenario, size, seed))
+    process.start()
+    result = queue.get()
+    process.join()
+    return result
+
+
+def _git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=CURRENT_DIR,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Benchmark the review pipeline against a deterministic fake Google Play backend")
+    parser.add_argument("--sizes", default="10000", help="Comma-separated review counts (e.g. 10000,1000000,10000000)")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help=f"Comma-separated subset of {', '.join(SCENARIOS)}")
+    parser.add_argument("--seed", type=int, default=7, help="Seed of the synthetic review stream")
+    parser.add_argument("--output", help="Append JSON lines to this file as well as printing them")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    revision = _git_revision()
+    started_at = datetime.now().isoformat(timespec="seconds")
+    for size in (int(value) for value in args.sizes.split(",")):
+        for scenario in args.scenarios.split(","):
+            if scenario not in SCENARIOS:
+                raise SystemExit(f"unknown scenario: {scenario}")
+            result = run_isolated(scenario, size, args.seed)
+            result.update({"revision": revision, "started_at": started_at, "date": f"{date.today():%Y-%m-%d}"})
+            line = json.dumps(result, ensure_ascii=False)
+            print(line, flush=True)
+            if args.output:
+                with open(args.output, "a", encoding="utf-8") as f:
+                    f.write(line + "\n")
@@ -0,0 +1,184 @@
+"""Offline check of the scraper's request governor against a flaky, slow stand-in for ``gps.reviews``.
+
+``FlakyReviews`` fails a seeded share of calls with the vendored client's
+``ExtraHTTPError`` (what the store raises when throttling) and sleeps on
+every call. The governors are built with ``scraper.play_governor``, so
+retries, backoff, giving up on ``NotFoundError`` and the adaptive
+concurrency limit are exercised with the error classes a real run uses,
+without the network. Exits non-zero when a check fails.
+
+    python3 check_governor.py
+    python3 check_governor.py --error-rate 0.4 --latency-ms 5 --seed 3
+"""
+from __future__ import annotations
+
+import argparse
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Type
+
+import request_governor
+from request_governor import RequestGovernor
+from scraper import play_governor
+
+# importing scraper puts the vendored client on the path
+from gps.exceptions import ExtraHTTPError, NotFoundError  # noqa: E402
+
+
+def governor(sleep: Callable[[float], None] = lambda _: None, **rate_limit) -> RequestGovernor:
+    """``play_governor`` for a config whose ``rate_limit`` is ``rate_limit``, unpaced, sleeping through ``sleep``."""
+    config: Dict = {"rate_limit": {"requests_per_second": 0, **rate_limit}}
+    result = play_governor(config)
+    # the backoff delays are recorded instead of slept
+    result._sleep = sleep
+    return result
+
+
+class FlakyReviews:
+    """``reviews``-shaped callable failing ``error_rate`` of calls (or the first ``fail_first``) after ``latency`` seconds."""
+
+    def __init__(
+        self,
+        error_rate: float = 0.0,
+        latency: float = 0.0,
+        seed: int = 1,
+        fail_first: int = 0,
+        error: Type[Exception] = ExtraHTTPError,
+    ) -> None:
+        self.error_rate = error_rate
+        self.latency = latency
+        self.fail_first = fail_first
+        self.error = error
+        self.calls = 0
+        self.failures = 0
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def __call__(self, app_id: str, count: int = 100, **_):
+        with self._lock:
+            self.calls += 1
+            self.in_flight += 1
+            self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+            fail = self.calls <= self.fail_first or self._random.random() < self.error_rate
+            if fail:
+                self.failures += 1
+        try:
+            if self.latency:
+                time.sleep(self.latency)
+            if fail:
+                raise self.error("429 Too Many Requests")
+            return [{"userName": "user", "content": "ok", "score": 5}] * count, None
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+
+
+def check_retries(seed: int, error_rate: float, latency: float) -> None:
+    """Every failed attempt is retried and counted; callers only see successes."""
+    fake = FlakyReviews(error_rate, latency, seed)
+    play = governor(max_retries=50, max_concurrency=4)
+    for _ in range(200):
+        result, _token = play.call(fake, "app", count=3)
+        assert len(result) == 3
+    assert play.retries == fake.failures, (play.retries, fake.failures)
+    assert fake.calls == 200 + fake.failures
+    print(f"retries: {fake.failures} injected failures, {play.retries} retries over {fake.calls} calls")
+
+
+def check_not_found() -> None:
+    """``NotFoundError`` is raised by the first call, without a retry or a backoff."""
+    delays: List[float] = []
+    fake = FlakyReviews(fail_first=1, error=NotFoundError)
+    play = governor(delays.append, max_retries=5)
+    raised: Optional[BaseException] = None
+    try:
+        play.call(fake, "app")
+    except NotFoundError as exc:
+        raised = exc
+    assert raised is not None, "NotFoundError must be raised"
+    assert fake.calls == 1 and play.retries == 0 and not delays, (fake.calls, play.retries, delays)
+    print("not found: raised on the first call, no retry")
+
+
+def check_backoff(base: float, cap: float) -> None:
+    """With the jitter pinned to its ceiling, delays double per attempt up to ``backoff_max``; the last failure is raised."""
+    delays: List[float] = []
+    fake = FlakyReviews(fail_first=6)
+    play = governor(delays.append, max_retries=5, backoff_base=base, backoff_max=cap)
+    uniform = request_governor.random.uniform
+    request_governor.random.uniform = lambda low, high: high
+    raised: Optional[BaseException] = None
+    try:
+        play.call(fake, "app")
+    except ExtraHTTPError as exc:
+        raised = exc
+    finally:
+        request_governor.random.uniform = uniform
+    expected = [min(cap, base * 2**attempt) for attempt in range(5)]
+    assert raised is not None, "the sixth failure must be raised"
+    assert delays == expected, (delays, expected)
+    assert play.retries == 5 and fake.calls == 6
+    # with jitter, every delay stays within its ceiling
+    for attempt in range(8):
+        assert 0 <= play.backoff(attempt) <= min(cap, base * 2**attempt)
+    print(f"backoff: {', '.join(f'{delay:g}s' for delay in delays)}")
+
+
+def check_adaptive_limit(seed: int, latency: float, workers: int = 8) -> None:
+    """A burst of errors halves the concurrency limit, in-flight calls never exceed it, and successes raise it again."""
+    fake = FlakyReviews(error_rate=1.0, latency=latency, seed=seed)
+    play = governor(max_retries=0, max_concurrency=workers)
+    limits: List[int] = [play.limit.limit]
+
+    def attempt(_) -> None:
+        try:
+            play.call(fake, "app")
+        except ExtraHTTPError:
+            pass
+        limits.append(play.limit.limit)
+
+    with ThreadPoolExecutor(workers) as pool:
+        list(pool.map(attempt, range(workers * 4)))
+    drops = [limit for previous, limit in zip(limits, limits[1:]) if limit < previous]
+    assert drops, "the limit never dropped"
+    previous = workers
+    for limit in sorted(set(drops), reverse=True):
+        assert limit == max(1, previous // 2), (limit, previous)
+        previous = limit
+    assert play.limit.limit == 1, play.limit.limit
+
+    # at the reduced limit only one call is in flight at a time
+    fake.error_rate, fake.peak_in_flight = 0.0, 0
+    recover_after = play.limit.recover_after
+    with ThreadPoolExecutor(workers) as pool:
+        list(pool.map(attempt, range(recover_after - 1)))
+    assert fake.peak_in_flight == 1, fake.peak_in_flight
+    attempt(None)
+    assert play.limit.limit == 2, play.limit.limit
+    print(f"adaptive limit: {workers} -> {' -> '.join(str(limit) for limit in sorted(set(drops), reverse=True))}, back to 2 after {recover_after} successes")
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Check retries, backoff and adaptive concurrency of RequestGovernor offline")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--error-rate", type=float, default=0.25, help="Share of calls that fail (default: 0.25)")
+    parser.add_argument("--latency-ms", type=float, default=2.0, help="Sleep per call (default: 2)")
+    return parser.parse_args()
+
+
+def main() -> None:
+    args = parse_args()
+    latency = args.latency_ms / 1000
+    check_retries(args.seed, args.error_rate, latency)
+    check_not_found()
+    check_backoff(base=0.5, cap=4.0)
+    check_adaptive_limit(args.seed, latency)
+    print("governor checks passed")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,295 @@
+"""Resumable pagination state and its on-disk checkpoint store."""
+from __future__ import annotations
+
+import sqlite3
+import threading
+from datetime import date, datetime
+from pathlib import Path
+from typing import Callable, FrozenSet, Iterable, List, NamedTuple, Optional, Set, Tuple
+
+from records import Review, row_digest
+
+CheckpointKey = Tuple[str, str, str, int]
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS fetch_checkpoints (
+    package TEXT NOT NULL,
+    lang TEXT NOT NULL,
+    country TEXT NOT NULL,
+    sort INTEGER NOT NULL,
+    token TEXT,
+    page_count INTEGER NOT NULL,
+    oldest_date TEXT,
+    exhausted INTEGER NOT NULL DEFAULT 0,
+    updated_at TEXT NOT NULL,
+    PRIMARY KEY (package, lang, country, sort)
+);
+
+CREATE TABLE IF NOT EXISTS checkpoint_rows (
+    package TEXT NOT NULL,
+    lang TEXT NOT NULL,
+    country TEXT NOT NULL,
+    sort INTEGER NOT NULL,
+    page INTEGER NOT NULL,
+    name TEXT,
+    content TEXT,
+    score INTEGER,
+    at TEXT,
+    appversion TEXT
+);
+
+CREATE INDEX IF NOT EXISTS idx_checkpoint_rows_key
+    ON checkpoint_rows (package, lang, country, sort, page);
+
+-- reviews per day seen by earlier runs; seeds the fetch planner
+CREATE TABLE IF NOT EXISTS review_density (
+    package TEXT NOT NULL,
+    lang TEXT NOT NULL,
+    country TEXT NOT NULL,
+    reviews_per_day REAL NOT NULL,
+    updated_at TEXT NOT NULL,
+    PRIMARY KEY (package, lang, country)
+);
+
+-- newest review written by delta runs, per stream and output series (e.g. a frequency)
+CREATE TABLE IF NOT EXISTS stream_watermarks (
+    package TEXT NOT NULL,
+    lang TEXT NOT NULL,
+    country TEXT NOT NULL,
+    series TEXT NOT NULL,
+    newest_at TEXT NOT NULL,
+    -- hex row_digest of every review at newest_at, space separated
+    identities TEXT NOT NULL,
+    updated_at TEXT NOT NULL,
+    PRIMARY KEY (package, lang, country, series)
+);
+"""
+
+
+class FetchState:
+    """Pagination progress for one review stream, kept so a fetch can be resumed."""
+
+    def __init__(self) -> None:
+        self.rows: List[Review] = []
+        self.continuation_token = None
+        self.pages = 0
+        self.total = 0
+        self.oldest: Optional[date] = None
+        self.exhausted = False
+        self.boundary_keys: Set[Tuple] = set()
+        # time span covered by the fetched reviews, for the reviews-per-day estimate
+        self.newest_at: Optional[datetime] = None
+        self.oldest_at: Optional[datetime] = None
+
+    def note_times(self, rows: List[Review]) -> None:
+        for row in rows:
+            at = row.at
+            if not isinstance(at, datetime):
+                continue
+            if self.newest_at is None or at > self.newest_at:
+                self.newest_at = at
+            if self.oldest_at is None or at < self.oldest_at:
+                self.oldest_at = at
+
+
+def review_key(row: Review) -> Tuple:
+    return (row.name, row.at, row.content)
+
+
+class Watermark(NamedTuple):
+    """The newest review taken from a stream: its time and the identities of every review at that time."""
+
+    at: datetime
+    identities: FrozenSet[bytes]
+
+    def is_new(self, row: Review) -> bool:
+        at = row.at
+        if not isinstance(at, datetime):
+            return True
+        return at > self.at or (at == self.at and row_digest(row) not in self.identities)
+
+
+def advance_watermark(mark: Optional[Watermark], rows: Iterable[Review]) -> Optional[Watermark]:
+    """``mark`` moved up to the newest of ``rows``."""
+    for row in rows:
+        at = row.at
+        if not isinstance(at, datetime):
+            continue
+        if mark is None or at > mark.at:
+            mark = Watermark(at, frozenset([row_digest(row)]))
+        elif at == mark.at:
+            mark = Watermark(at, mark.identities | {row_digest(row)})
+    return mark
+
+
+def has_more(continuation_token) -> bool:
+    if continuation_token is None:
+        return False
+    return getattr(continuation_token, "token", continuation_token) is not None
+
+
+def _token_text(continuation_token) -> Optional[str]:
+    if continuation_token is None:
+        return None
+    return getattr(continuation_token, "token", continuation_token)
+
+
+def _build_token(token: str, key: CheckpointKey, count: int):
+    from gps.features.reviews import _ContinuationToken
+
+    _, lang, country, sort = key
+    return _ContinuationToken(token, lang, country, sort, count, None, None)
+
+
+def _encode_at(value) -> Optional[str]:
+    if value is None:
+        return None
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return str(value)
+
+
+def _decode_at(value: Optional[str]):
+    if value is None:
+        return None
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        return value
+
+
+class CheckpointStore:
+    """SQLite table of continuation tokens and fetched rows, written after every page."""
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        # shared by the worker threads; every statement runs under the lock
+        self._conn = sqlite3.connect(str(path), check_same_thread=False)
+        self._lock = threading.Lock()
+        self._conn.executescript(_SCHEMA)
+        self._conn.commit()
+
+    def close(self) -> None:
+        self._conn.close()
+
+    def save_page(self, key: CheckpointKey, state: FetchState, batch: List[Review]) -> None:
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT INTO checkpoint_rows (package, lang, country, sort, page, name, content, score, at, appversion) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                [
+                    (*key, state.pages, row.name, row.content, row.score, _encode_at(row.at), row.appversion)
+                    for row in batch
+                ],
+            )
+            self._conn.execute(
+                "INSERT OR REPLACE INTO fetch_checkpoints "
+                "(package, lang, country, sort, token, page_count, oldest_date, exhausted, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    *key,
+                    _token_text(state.continuation_token),
+                    state.pages,
+                    state.oldest.isoformat() if state.oldest else None,
+                    int(state.exhausted),
+                    datetime.now().isoformat(timespec="seconds"),
+                ),
+            )
+
+    def page_saver(self, key: CheckpointKey) -> Callable[[FetchState, List[Review]], None]:
+        def _save(state: FetchState, batch: List[Review]) -> None:
+            self.save_page(key, state, batch)
+
+        return _save
+
+    def load(self, key: CheckpointKey, count: int) -> Optional[FetchState]:
+        with self._lock:
+            return self._load(key, count)
+
+    def _load(self, key: CheckpointKey, count: int) -> Optional[FetchState]:
+        found = self._conn.execute(
+            "SELECT token, page_count, oldest_date, exhausted FROM fetch_checkpoints "
+            "WHERE package = ? AND lang = ? AND country = ? AND sort = ?",
+            key,
+        ).fetchone()
+        if found is None:
+            return None
+        token, page_count, oldest_date, exhausted = found
+
+        state = FetchState()
+        state.pages = page_count
+        state.oldest = date.fromisoformat(oldest_date) if oldest_date else None
+        state.exhausted = bool(exhausted)
+        if token is not None:
+            state.continuation_token = _build_token(token, key, count)
+        cursor = self._conn.execute(
+            "SELECT page, name, content, score, at, appversion FROM checkpoint_rows "
+            "WHERE package = ? AND lang = ? AND country = ? AND sort = ? ORDER BY rowid",
+            key,
+        )
+        for page, name, content, score, at, appversion in cursor:
+            row = Review(name, content, score, _decode_at(at), appversion)
+            state.rows.append(row)
+            state.total += 1
+            if page == page_count:
+                state.boundary_keys.add(review_key(row))
+        state.note_times(state.rows)
+        return state
+
+    def clear(self, key: CheckpointKey) -> None:
+        with self._lock, self._conn:
+            where = "WHERE package = ? AND lang = ? AND country = ? AND sort = ?"
+            self._conn.execute(f"DELETE FROM checkpoint_rows {where}", key)
+            self._conn.execute(f"DELETE FROM fetch_checkpoints {where}", key)
+
+    def density(self, package: str, lang: str, country: str) -> Optional[float]:
+        """Reviews per day recorded for the stream by an earlier run."""
+        with self._lock:
+            found = self._conn.execute(
+                "SELECT reviews_per_day FROM review_density WHERE package = ? AND lang = ? AND country = ?",
+                (package, lang, country),
+            ).fetchone()
+        return found[0] if found else None
+
+    def save_density(self, package: str, lang: str, country: str, reviews_per_day: float) -> None:
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO review_density (package, lang, country, reviews_per_day, updated_at) VALUES (?, ?, ?, ?, ?)",
+                (package, lang, country, reviews_per_day, datetime.now().isoformat(timespec="seconds")),
+            )
+
+    def watermark(self, package: str, lang: str, country: str, series: str) -> Optional[Watermark]:
+        with self._lock:
+            found = self._conn.execute(
+                "SELECT newest_at, identities FROM stream_watermarks WHERE package = ? AND lang = ? AND country = ? AND series = ?",
+                (package, lang, country, series),
+            ).fetchone()
+        if found is None:
+            return None
+        newest_at, identities = found
+        return Watermark(datetime.fromisoformat(newest_at), frozenset(bytes.fromhex(value) for value in identities.split()))
+
+    def save_watermark(self, package: str, lang: str, country: str, series: str, mark: Watermark) -> None:
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO stream_watermarks (package, lang, country, series, newest_at, identities, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (
+                    package,
+                    lang,
+                    country,
+                    series,
+                    mark.at.isoformat(),
+                    " ".join(sorted(identity.hex() for identity in mark.identities)),
+                    datetime.now().isoformat(timespec="seconds"),
+                ),
+            )
+
+    def start(self, key: CheckpointKey, count: int, resume: bool) -> FetchState:
+        """Return the saved state for ``key`` when resuming, otherwise a fresh one."""
+        if resume:
+            state = self.load(key, count)
+            if state is not None:
+                return state
+        self.clear(key)
+        return FetchState()
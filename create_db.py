@@ -1,6 +1,8 @@
 import sqlite3
 from pathlib import Path
 
+from review_db import apply_schema
+
 # Database file
 DB_PATH = Path("reviews.db")
 
@@ -9,12 +11,12 @@ SCHEMA_PATH = Path("create_tables.sql")
 
 def main():
     conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
 
     with open(SCHEMA_PATH, "r") as f:
         schema_sql = f.read()
 
-    cursor.executescript(schema_sql)
+    # also upgrades older databases and fills the monthly and daily rollups
+    apply_schema(conn, schema_sql)
     conn.commit()
     conn.close()
 
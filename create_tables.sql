@@ -16,5 +16,158 @@ CREATE TABLE IF NOT EXISTS reviews (
     year_month TEXT,
     app_version TEXT,
     text_length INTEGER,
+    content_hash TEXT,
+    duplicate_cluster_id INTEGER,
     FOREIGN KEY (app_id) REFERENCES apps(app_id)
 );
+
+-- natural key: the same review is only stored once, however often it is loaded
+CREATE UNIQUE INDEX IF NOT EXISTS idx_reviews_natural_key
+    ON reviews (app_id, IFNULL(user_name, ''), IFNULL(review_date, ''), content_hash);
+
+-- secondary indexes for per-app monthly and date-range queries
+CREATE INDEX IF NOT EXISTS idx_reviews_app_month_rating
+    ON reviews (app_id, year_month, rating);
+
+CREATE INDEX IF NOT EXISTS idx_reviews_app_date
+    ON reviews (app_id, review_date);
+
+CREATE INDEX IF NOT EXISTS idx_reviews_app_cluster
+    ON reviews (app_id, duplicate_cluster_id);
+
+-- MinHash LSH band buckets of near_duplicates.py: reviews sharing a bucket share a cluster
+CREATE TABLE IF NOT EXISTS review_lsh_buckets (
+    app_id INTEGER NOT NULL,
+    band INTEGER NOT NULL,
+    bucket INTEGER NOT NULL,
+    cluster_id INTEGER NOT NULL,
+    PRIMARY KEY (app_id, band, bucket)
+) WITHOUT ROWID;
+
+-- monthly rollup, kept current by the triggers below
+CREATE TABLE IF NOT EXISTS review_monthly_stats (
+    app_id INTEGER NOT NULL,
+    year_month TEXT NOT NULL,
+    review_count INTEGER NOT NULL DEFAULT 0,
+    rating_count INTEGER NOT NULL DEFAULT 0,
+    rating_sum INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (app_id, year_month),
+    FOREIGN KEY (app_id) REFERENCES apps(app_id)
+);
+
+CREATE TRIGGER IF NOT EXISTS trg_reviews_monthly_insert
+AFTER INSERT ON reviews
+BEGIN
+    INSERT INTO review_monthly_stats (app_id, year_month, review_count, rating_count, rating_sum)
+    VALUES (NEW.app_id, IFNULL(NEW.year_month, ''), 1, NEW.rating IS NOT NULL, IFNULL(NEW.rating, 0))
+    ON CONFLICT (app_id, year_month) DO UPDATE SET
+        review_count = review_count + 1,
+        rating_count = rating_count + excluded.rating_count,
+        rating_sum = rating_sum + excluded.rating_sum;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_reviews_monthly_delete
+AFTER DELETE ON reviews
+BEGIN
+    UPDATE review_monthly_stats
+    SET review_count = review_count - 1,
+        rating_count = rating_count - (OLD.rating IS NOT NULL),
+        rating_sum = rating_sum - IFNULL(OLD.rating, 0)
+    WHERE app_id = OLD.app_id AND year_month = IFNULL(OLD.year_month, '');
+END;
+
+-- daily rollup per app and app version, kept current by the triggers below; rollups.py derives day/week/month series from it
+CREATE TABLE IF NOT EXISTS review_daily_stats (
+    app_id INTEGER NOT NULL,
+    day TEXT NOT NULL,
+    app_version TEXT NOT NULL,
+    review_count INTEGER NOT NULL DEFAULT 0,
+    rating_count INTEGER NOT NULL DEFAULT 0,
+    rating_sum INTEGER NOT NULL DEFAULT 0,
+    rating_1 INTEGER NOT NULL DEFAULT 0,
+    rating_2 INTEGER NOT NULL DEFAULT 0,
+    rating_3 INTEGER NOT NULL DEFAULT 0,
+    rating_4 INTEGER NOT NULL DEFAULT 0,
+    rating_5 INTEGER NOT NULL DEFAULT 0,
+    text_length_sum INTEGER NOT NULL DEFAULT 0,
+    text_length_sq_sum INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (app_id, day, app_version),
+    FOREIGN KEY (app_id) REFERENCES apps(app_id)
+) WITHOUT ROWID;
+
+CREATE TRIGGER IF NOT EXISTS trg_reviews_daily_insert
+AFTER INSERT ON reviews
+BEGIN
+    INSERT INTO review_daily_stats (
+        app_id, day, app_version, review_count, rating_count, rating_sum,
+        rating_1, rating_2, rating_3, rating_4, rating_5, text_length_sum, text_length_sq_sum
+    )
+    VALUES (
+        NEW.app_id, IFNULL(substr(NEW.review_date, 1, 10), ''), IFNULL(NEW.app_version, ''),
+        1, NEW.rating IS NOT NULL, IFNULL(NEW.rating, 0),
+        NEW.rating IS 1, NEW.rating IS 2, NEW.rating IS 3, NEW.rating IS 4, NEW.rating IS 5,
+        IFNULL(NEW.text_length, 0), IFNULL(NEW.text_length, 0) * IFNULL(NEW.text_length, 0)
+    )
+    ON CONFLICT (app_id, day, app_version) DO UPDATE SET
+        review_count = review_count + 1,
+        rating_count = rating_count + excluded.rating_count,
+        rating_sum = rating_sum + excluded.rating_sum,
+        rating_1 = rating_1 + excluded.rating_1,
+        rating_2 = rating_2 + excluded.rating_2,
+        rating_3 = rating_3 + excluded.rating_3,
+        rating_4 = rating_4 + excluded.rating_4,
+        rating_5 = rating_5 + excluded.rating_5,
+        text_length_sum = text_length_sum + excluded.text_length_sum,
+        text_length_sq_sum = text_length_sq_sum + excluded.text_length_sq_sum;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_reviews_daily_delete
+AFTER DELETE ON reviews
+BEGIN
+    UPDATE review_daily_stats
+    SET review_count = review_count - 1,
+        rating_count = rating_count - (OLD.rating IS NOT NULL),
+        rating_sum = rating_sum - IFNULL(OLD.rating, 0),
+        rating_1 = rating_1 - (OLD.rating IS 1),
+        rating_2 = rating_2 - (OLD.rating IS 2),
+        rating_3 = rating_3 - (OLD.rating IS 3),
+        rating_4 = rating_4 - (OLD.rating IS 4),
+        rating_5 = rating_5 - (OLD.rating IS 5),
+        text_length_sum = text_length_sum - IFNULL(OLD.text_length, 0),
+        text_length_sq_sum = text_length_sq_sum - IFNULL(OLD.text_length, 0) * IFNULL(OLD.text_length, 0)
+    WHERE app_id = OLD.app_id
+      AND day = IFNULL(substr(OLD.review_date, 1, 10), '')
+      AND app_version = IFNULL(OLD.app_version, '');
+    DELETE FROM review_daily_stats
+    WHERE app_id = OLD.app_id
+      AND day = IFNULL(substr(OLD.review_date, 1, 10), '')
+      AND app_version = IFNULL(OLD.app_version, '')
+      AND review_count = 0;
+END;
+
+-- full-text index over review_text (stemmed, accent-insensitive); external content, so the text is stored once in reviews
+CREATE VIRTUAL TABLE IF NOT EXISTS reviews_fts USING fts5(
+    review_text,
+    content = 'reviews',
+    content_rowid = 'review_id',
+    tokenize = 'porter unicode61 remove_diacritics 2'
+);
+
+CREATE TRIGGER IF NOT EXISTS trg_reviews_fts_insert
+AFTER INSERT ON reviews
+BEGIN
+    INSERT INTO reviews_fts (rowid, review_text) VALUES (NEW.review_id, NEW.review_text);
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_reviews_fts_delete
+AFTER DELETE ON reviews
+BEGIN
+    INSERT INTO reviews_fts (reviews_fts, rowid, review_text) VALUES ('delete', OLD.review_id, OLD.review_text);
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_reviews_fts_update
+AFTER UPDATE OF review_text ON reviews
+BEGIN
+    INSERT INTO reviews_fts (reviews_fts, rowid, review_text) VALUES ('delete', OLD.review_id, OLD.review_text);
+    INSERT INTO reviews_fts (rowid, review_text) VALUES (NEW.review_id, NEW.review_text);
+END;
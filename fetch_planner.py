@@ -0,0 +1,68 @@
+"""Pick page sizes and page counts for backfills from the observed review density."""
+from __future__ import annotations
+
+import math
+from datetime import date, datetime, time
+from typing import Optional, Tuple
+
+from checkpoints import FetchState
+
+# spans shorter than this say little about the daily rate
+MIN_SPAN_DAYS = 1 / 24
+# how many days of observation the stored rate from earlier runs counts for
+PRIOR_WEIGHT_DAYS = 1.0
+
+
+class DensityPlanner:
+    """Estimate reviews per day and plan the requests still needed to reach a date.
+
+    The rate blends what the fetched pages cover with the rate stored by
+    earlier runs. The remaining reviews (times ``margin``) are spread over as
+    few pages as ``count_cap`` allows, with an even page size so the last page
+    does not run far past the target date.
+    """
+
+    def __init__(
+        self,
+        count_start: int,
+        count_cap: int,
+        prior_rate: Optional[float] = None,
+        margin: float = 1.2,
+        min_count: int = 10,
+    ) -> None:
+        self.count_start = max(1, count_start)
+        self.count_cap = max(self.count_start, count_cap)
+        self.prior_rate = prior_rate if prior_rate and prior_rate > 0 else None
+        self.margin = max(1.0, margin)
+        self.min_count = max(1, min(min_count, self.count_cap))
+
+    @staticmethod
+    def observed_rate(state: FetchState) -> Optional[float]:
+        if state.newest_at is None or state.oldest_at is None or not state.total:
+            return None
+        span = (state.newest_at - state.oldest_at).total_seconds() / 86400
+        if span < MIN_SPAN_DAYS:
+            return None
+        return state.total / span
+
+    def rate(self, state: FetchState) -> Optional[float]:
+        observed = self.observed_rate(state)
+        if observed is None:
+            return self.prior_rate
+        if self.prior_rate is None:
+            return observed
+        span = (state.newest_at - state.oldest_at).total_seconds() / 86400
+        return (observed * span + self.prior_rate * PRIOR_WEIGHT_DAYS) / (span + PRIOR_WEIGHT_DAYS)
+
+    def plan(self, state: FetchState, stop_at: date, now: Optional[datetime] = None) -> Tuple[int, int]:
+        """Return ``(count, max_pages)`` for the next fetch; ``max_pages`` includes the pages already held."""
+        rate = self.rate(state)
+        if rate is None:
+            # nothing to go on yet: one probe page
+            return self.count_start, state.pages + 1
+        frontier = state.oldest_at or now or datetime.now()
+        remaining_days = max(0.0, (frontier - datetime.combine(stop_at, time.min)).total_seconds() / 86400)
+        needed = max(1, math.ceil(rate * remaining_days * self.margin))
+        pages = math.ceil(needed / self.count_cap)
+        count = max(self.min_count, math.ceil(needed / pages))
+        return count, state.pages + pages
@@ -1,15 +1,47 @@
-import pandas as pd
-import sqlite3
+import argparse
+import time
 from pathlib import Path
+from typing import Iterator, Optional
 
-CSV_PATH = Path("/Users/iwi.whyyy/Desktop/googleplay/output/merged_chatgpt_weekly.csv")
+import pandas as pd
+
+from pipeline import Pipeline
+from review_db import REVIEW_COLUMNS, content_hash, high_water_mark
+from sinks import SqliteReviewSink
+
+DB_PATH = Path("reviews.db")
+APP_ID = 1
+CHUNK_SIZE = 100_000
+BATCH_SIZE = 10000
+
+SOURCE_COLUMNS = ["name", "content", "score", "at", "appversion"]
+TEXT_COLUMNS = ["name", "content", "appversion"]
 
-def main():
-    print("Starting load_reviews.py")
-    
-    df = pd.read_csv(CSV_PATH)
-    print(f"Loaded CSV with {len(df)} rows")
 
+def iter_chunks(path: Path, chunk_size: int, package: Optional[str] = None) -> Iterator[pd.DataFrame]:
+    """Yield the review columns of a merged/period CSV or a Parquet file or dataset, ``chunk_size`` rows at a time."""
+    if path.is_dir() or path.suffix == ".parquet":
+        import pyarrow.dataset as ds
+
+        dataset = ds.dataset(path, format="parquet", partitioning="hive")
+        # a partitioned dataset holds every package; keep the one being loaded
+        row_filter = ds.field("package") == package if package and "package" in dataset.schema.names else None
+        for batch in dataset.to_batches(columns=SOURCE_COLUMNS, filter=row_filter, batch_size=chunk_size):
+            yield batch.to_pandas()
+        return
+    # the text columns stay the strings the sink stores: no "NA" -> NULL, "10" -> 10.0 or "1.10" -> 1.1; only empty cells are NULL
+    yield from pd.read_csv(
+        path,
+        usecols=SOURCE_COLUMNS,
+        chunksize=chunk_size,
+        encoding="utf-8-sig",
+        dtype={column: str for column in TEXT_COLUMNS},
+        keep_default_na=False,
+        na_values={column: [""] for column in SOURCE_COLUMNS},
+    )
+
+
+def prepare_chunk(df: pd.DataFrame, app_id: int, latest: Optional[pd.Timestamp]) -> list:
     df = df.rename(columns={
         "name": "user_name",
         "content": "review_text",
@@ -18,25 +50,95 @@ def main():
         "appversion": "app_version"
     })
 
-    df["app_id"] = 1
+    df["app_id"] = app_id
     df["review_date"] = pd.to_datetime(df["review_date"], errors="coerce")
-    df["year_month"] = df["review_date"].dt.to_period("M").astype(str)
-    df["text_length"] = df["review_text"].astype(str).str.split().str.len()
-    df = df.drop(columns=["source_file"])
 
-    conn = sqlite3.connect("reviews.db")
+    # only rows at or after the newest stored review can be new; ties and undated rows are resolved by the unique key
+    if latest is not None:
+        df = df[df["review_date"].isna() | (df["review_date"] >= latest)]
+
+    text = df["review_text"].where(df["review_text"].notna(), None)
+    df["year_month"] = df["review_date"].dt.to_period("M").astype(str).where(df["review_date"].notna(), None)
+    # counts the words in place, without building a token list per review; the cast keeps .str valid whatever dtype the chunk got
+    df["text_length"] = text.astype("string").str.count(r"\S+").fillna(0).astype(int)
+    df["content_hash"] = text.map(lambda value: content_hash(value if isinstance(value, str) else None))
+    df["review_date"] = df["review_date"].dt.strftime("%Y-%m-%d %H:%M:%S")
+    df["duplicate_cluster_id"] = None
+
+    records = df[list(REVIEW_COLUMNS)].astype(object)
+    records = records.where(records.notna(), None)
+    return list(records.itertuples(index=False, name=None))
 
-    df.to_sql(
-        "reviews",
-        conn,
-        if_exists="append",
-        index=False
-    )
 
-    conn.close()
-    print(f"Inserted {len(df)} rows into reviews table.")
+def load(
+    input_path: Path,
+    db_path: Path = DB_PATH,
+    app_id: Optional[int] = APP_ID,
+    package: Optional[str] = None,
+    chunk_size: int = CHUNK_SIZE,
+    batch_size: int = BATCH_SIZE,
+    cluster_duplicates: bool = False,
+) -> int:
+    sink = SqliteReviewSink(db_path, package, batch_size, cluster_duplicates, app_id=app_id, prepared=True)
+    latest = high_water_mark(sink.connection, sink.app_id)
+    if latest is not None:
+        print(f"Skipping rows before the stored high-water mark {latest}")
+    latest_ts = pd.Timestamp(latest) if latest is not None else None
+
+    started = time.perf_counter()
+    read = kept = skipped = 0
+
+    def counted(chunks: Iterator[pd.DataFrame]) -> Iterator[pd.DataFrame]:
+        nonlocal read
+        for chunk in chunks:
+            read += len(chunk)
+            yield chunk
+            # the chunk has gone through every stage once the next one is requested
+            sink.flush()
+            elapsed = time.perf_counter() - started
+            print(f"{read} rows read, {sink.inserted} inserted ({read / elapsed:,.0f} rows/s)")
+
+    def prepare(chunk: pd.DataFrame) -> list:
+        nonlocal kept, skipped
+        rows = prepare_chunk(chunk, sink.app_id, latest_ts)
+        kept += len(rows)
+        skipped += len(chunk) - len(rows)
+        return rows
+
+    Pipeline(counted(iter_chunks(input_path, chunk_size, package)), sink, [prepare]).run()
+
+    elapsed = time.perf_counter() - started
+    print(f"Inserted {sink.inserted} rows into reviews table ({kept - sink.inserted} already stored) in {elapsed:.1f}s.")
+    if skipped:
+        print(f"Skipped {skipped} rows dated before the high-water mark {latest}; they were not compared with the stored reviews.")
+    return sink.inserted
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Load scraped reviews from CSV or Parquet into reviews.db in constant memory")
+    parser.add_argument("input", help="Merged or period CSV, Parquet file, or Parquet dataset directory")
+    parser.add_argument("--db", default=str(DB_PATH), help="SQLite database (default: reviews.db)")
+    parser.add_argument("--app-id", type=int, default=APP_ID, help="apps.app_id the reviews belong to (default: 1)")
+    parser.add_argument("--package", help="Resolve the app by package name instead of --app-id (also filters Parquet datasets)")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE, help="Rows parsed per chunk (default: 100000)")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE, help="Rows per insert transaction (default: 10000)")
+    parser.add_argument("--cluster-duplicates", action="store_true", help="Label rows with near-duplicate cluster ids (needs numpy)")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    print("Starting load_reviews.py")
+    load(
+        Path(args.input),
+        Path(args.db),
+        args.app_id,
+        args.package,
+        max(1, args.chunk_size),
+        max(1, args.batch_size),
+        args.cluster_duplicates,
+    )
     print("load_reviews.py completed successfully")
 
 if __name__ == "__main__":
     main()
-
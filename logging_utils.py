@@ -1,10 +1,33 @@
 """Shared logging helpers for Google Play scripts."""
 from __future__ import annotations
 
+import json
 import logging
 import os
+from datetime import datetime, timezone
 from typing import Optional
 
+# attributes every LogRecord has; anything else was passed through ``extra``
+_RECORD_ATTRS = set(vars(logging.makeLogRecord({}))) | {"message", "asctime"}
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line, including any fields passed through ``extra``."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        payload = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRS:
+                payload[key] = value
+        if record.exc_info:
+            payload["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(payload, ensure_ascii=False, default=str)
+
 
 def _resolve_level(default: int = logging.INFO) -> int:
     env_level = os.getenv("GOOGLEPLAY_LOG_LEVEL")
@@ -22,7 +45,10 @@ def get_logger(name: Optional[str] = None) -> logging.Logger:
         return logger
 
     handler = logging.StreamHandler()
-    formatter = logging.Formatter("[%(levelname)s] %(message)s")
+    if os.getenv("GOOGLEPLAY_LOG_FORMAT", "").lower() == "json":
+        formatter: logging.Formatter = JsonFormatter()
+    else:
+        formatter = logging.Formatter("[%(levelname)s] %(message)s")
     handler.setFormatter(formatter)
     logger.addHandler(handler)
     logger.setLevel(_resolve_level())
@@ -0,0 +1,192 @@
+"""Incrementally merge per-period review CSVs into one deduplicated CSV.
+
+A SQLite manifest next to the merged file records every source file that was
+merged (size, mtime, SHA-1) and a digest of every review written. Each run
+only parses files that are new or whose content changed, and appends the
+reviews not seen before, so daily and weekly outputs covering the same days
+can be merged together without duplicates.
+"""
+from __future__ import annotations
+
+import argparse
+import csv
+import hashlib
+import sqlite3
+import sys
+from pathlib import Path
+from typing import Dict, Iterator, List, NamedTuple, Optional, Sequence, Tuple
+
+from logging_utils import get_logger
+from records import REVIEW_FIELDS, review_digest
+
+LOGGER = get_logger("googleplay.merge")
+
+CURRENT_DIR = Path(__file__).resolve().parent
+ROOT_DIR = CURRENT_DIR.parent
+MERGED_FIELDS: Tuple[str, ...] = (*REVIEW_FIELDS, "source_file")
+
+csv.field_size_limit(sys.maxsize)
+
+MANIFEST_SCHEMA = """
+CREATE TABLE IF NOT EXISTS merged_files (
+    path TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    sha1 TEXT NOT NULL,
+    rows_read INTEGER NOT NULL,
+    rows_added INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS merged_keys (
+    digest BLOB PRIMARY KEY
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS merged_output (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    size INTEGER NOT NULL
+);
+"""
+
+
+class MergeResult(NamedTuple):
+    files_merged: int
+    files_unchanged: int
+    rows_read: int
+    rows_added: int
+
+
+def file_sha1(path: Path) -> str:
+    digest = hashlib.sha1()
+    with path.open("rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def iter_csv_rows(path: Path) -> Iterator[List[str]]:
+    """Yield the data rows of a period CSV; placeholder files for empty periods yield nothing."""
+    with path.open("r", encoding="utf-8-sig", newline="") as f:
+        reader = csv.reader(f)
+        header = next(reader, None)
+        if header is None or header == ["empty"]:
+            return
+        if tuple(header) != REVIEW_FIELDS:
+            raise ValueError(f"{path}: unexpected columns {header}")
+        yield from reader
+
+
+class MergeManifest:
+    def __init__(self, path: Path) -> None:
+        self.conn = sqlite3.connect(str(path))
+        self.conn.executescript(MANIFEST_SCHEMA)
+
+    def entry(self, path: Path) -> Optional[Tuple[int, int, str]]:
+        return self.conn.execute("SELECT size, mtime_ns, sha1 FROM merged_files WHERE path = ?", (str(path),)).fetchone()
+
+    def output_size(self) -> int:
+        found = self.conn.execute("SELECT size FROM merged_output WHERE id = 1").fetchone()
+        return found[0] if found else 0
+
+    def add_key(self, digest: bytes) -> bool:
+        """Remember ``digest``; False when it was already merged."""
+        return self.conn.execute("INSERT OR IGNORE INTO merged_keys (digest) VALUES (?)", (digest,)).rowcount == 1
+
+    def record(self, path: Path, size: int, mtime_ns: int, sha1: str, rows_read: int, rows_added: int, output_size: int) -> None:
+        self.conn.execute(
+            "INSERT OR REPLACE INTO merged_files (path, size, mtime_ns, sha1, rows_read, rows_added) VALUES (?, ?, ?, ?, ?, ?)",
+            (str(path), size, mtime_ns, sha1, rows_read, rows_added),
+        )
+        self.conn.execute("INSERT OR REPLACE INTO merged_output (id, size) VALUES (1, ?)", (output_size,))
+
+    def close(self) -> None:
+        self.conn.close()
+
+
+def _source_files(inputs: Sequence[Path]) -> List[Path]:
+    files: List[Path] = []
+    for source in inputs:
+        files.extend(sorted(source.glob("*.csv")) if source.is_dir() else [source])
+    return files
+
+
+def merge(inputs: Sequence[Path], output: Path, manifest_path: Optional[Path] = None, rebuild: bool = False) -> MergeResult:
+    """Append the new reviews of new or changed files in ``inputs`` to ``output``."""
+    manifest_path = manifest_path or output.with_name(f"{output.name}.manifest.sqlite")
+    if rebuild:
+        for stale in (output, manifest_path):
+            if stale.exists():
+                stale.unlink()
+    output.parent.mkdir(parents=True, exist_ok=True)
+    manifest = MergeManifest(manifest_path)
+    stats: Dict[str, int] = {"files_merged": 0, "files_unchanged": 0, "rows_read": 0, "rows_added": 0}
+    try:
+        # drop rows appended by a run that stopped before its manifest commit
+        committed = manifest.output_size()
+        if output.exists() and output.stat().st_size > committed:
+            LOGGER.warning("Truncating %s to the %d bytes recorded in its manifest", output, committed)
+            with output.open("r+b") as f:
+                f.truncate(committed)
+        new_output = not output.exists() or output.stat().st_size == 0
+        with output.open("a", encoding="utf-8", newline="") as out:
+            writer = csv.writer(out)
+            if new_output:
+                writer.writerow(MERGED_FIELDS)
+            for path in _source_files(inputs):
+                info = path.stat()
+                previous = manifest.entry(path)
+                if previous is not None and previous[:2] == (info.st_size, info.st_mtime_ns):
+                    stats["files_unchanged"] += 1
+                    continue
+                sha1 = file_sha1(path)
+                rows_read = rows_added = 0
+                if previous is None or previous[2] != sha1:
+                    for row in iter_csv_rows(path):
+                        rows_read += 1
+                        name, content, _, at, _ = row
+                        if manifest.add_key(review_digest(name, at, content)):
+                            writer.writerow([*row, path.name])
+                            rows_added += 1
+                    stats["files_merged"] += 1
+                else:
+                    # touched but identical; only the stat fields are refreshed
+                    stats["files_unchanged"] += 1
+                out.flush()
+                with manifest.conn:
+                    manifest.record(path, info.st_size, info.st_mtime_ns, sha1, rows_read, rows_added, output.stat().st_size)
+                stats["rows_read"] += rows_read
+                stats["rows_added"] += rows_added
+                if rows_read:
+                    LOGGER.info("%s: %d of %d reviews were new", path.name, rows_added, rows_read)
+    finally:
+        manifest.close()
+    result = MergeResult(**stats)
+    LOGGER.info(
+        "Merged %d files (%d unchanged) into %s: %d reviews read, %d appended",
+        result.files_merged,
+        result.files_unchanged,
+        output,
+        result.rows_read,
+        result.rows_added,
+    )
+    return result
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Append new or changed period CSVs to a merged, deduplicated review CSV")
+    parser.add_argument(
+        "inputs",
+        nargs="*",
+        help="CSV files or directories of CSVs, merged in the order given (default: ../output/schedule/weekly)",
+    )
+    parser.add_argument("--output", help="Merged CSV (default: ../output/merged_chatgpt_weekly.csv)")
+    parser.add_argument("--manifest", help="Manifest database (default: <output>.manifest.sqlite)")
+    parser.add_argument("--rebuild", action="store_true", help="Discard the merged CSV and manifest and merge everything again")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    merge(
+        [Path(value) for value in args.inputs] or [ROOT_DIR / "output" / "schedule" / "weekly"],
+        Path(args.output) if args.output else ROOT_DIR / "output" / "merged_chatgpt_weekly.csv",
+        Path(args.manifest) if args.manifest else None,
+        rebuild=args.rebuild,
+    )
@@ -0,0 +1,142 @@
+"""Per-run counters, stage timers and latency histograms for the review pipeline."""
+from __future__ import annotations
+
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from logging_utils import get_logger
+
+LOGGER = get_logger("googleplay.metrics")
+
+PREFIX = "googleplay_"
+# upper bounds in seconds for the page fetch latency histogram
+LATENCY_BUCKETS: Tuple[float, ...] = (0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+class Histogram:
+    def __init__(self, buckets: Tuple[float, ...] = LATENCY_BUCKETS) -> None:
+        self.buckets = buckets
+        self.counts: List[int] = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def cumulative(self) -> List[Tuple[str, int]]:
+        running = 0
+        result = []
+        for bound, count in zip([*map(str, self.buckets), "+Inf"], self.counts):
+            running += count
+            result.append((bound, running))
+        return result
+
+
+class RunMetrics:
+    """Thread-safe counters and histograms for one run of a script.
+
+    Counters ending in ``_seconds_total`` hold the time spent in a stage;
+    ``timer`` adds to them.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        with self._lock:
+            self.started = time.monotonic()
+            self.counters: Dict[str, float] = {}
+            self.histograms: Dict[str, Histogram] = {}
+
+    def inc(self, name: str, value: float = 1) -> None:
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def observe(self, name: str, value: float) -> None:
+        with self._lock:
+            if name not in self.histograms:
+                self.histograms[name] = Histogram()
+            self.histograms[name].observe(value)
+
+    @contextmanager
+    def timer(self, stage: str) -> Iterator[None]:
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.inc(f"{stage}_seconds_total", time.perf_counter() - started)
+
+    def summary(self) -> Dict:
+        with self._lock:
+            elapsed = time.monotonic() - self.started
+            fetched = self.counters.get("reviews_fetched_total", 0)
+            return {
+                "duration_seconds": round(elapsed, 3),
+                "rows_per_second": round(fetched / elapsed, 1) if elapsed else 0.0,
+                "counters": {name: round(value, 3) for name, value in sorted(self.counters.items())},
+                "histograms": {
+                    name: {"count": hist.count, "sum": round(hist.sum, 3), "buckets": dict(hist.cumulative())}
+                    for name, hist in sorted(self.histograms.items())
+                },
+            }
+
+    def prometheus_text(self, success: bool) -> str:
+        """Render the run in the Prometheus text exposition format."""
+        summary = self.summary()
+        lines = [
+            f"# TYPE {PREFIX}run_success gauge",
+            f"{PREFIX}run_success {int(success)}",
+            f"# TYPE {PREFIX}run_duration_seconds gauge",
+            f"{PREFIX}run_duration_seconds {summary['duration_seconds']}",
+            f"# TYPE {PREFIX}run_rows_per_second gauge",
+            f"{PREFIX}run_rows_per_second {summary['rows_per_second']}",
+            f"# TYPE {PREFIX}last_run_timestamp_seconds gauge",
+            f"{PREFIX}last_run_timestamp_seconds {int(time.time())}",
+        ]
+        for name, value in summary["counters"].items():
+            lines.append(f"# TYPE {PREFIX}{name} counter")
+            lines.append(f"{PREFIX}{name} {value}")
+        for name, hist in summary["histograms"].items():
+            lines.append(f"# TYPE {PREFIX}{name} histogram")
+            for bound, count in hist["buckets"].items():
+                lines.append(f'{PREFIX}{name}_bucket{{le="{bound}"}} {count}')
+            lines.append(f"{PREFIX}{name}_sum {hist['sum']}")
+            lines.append(f"{PREFIX}{name}_count {hist['count']}")
+        return "\n".join(lines) + "\n"
+
+    def write_textfile(self, path: Path, success: bool) -> None:
+        """Write ``path`` for node_exporter's textfile collector, replacing it atomically."""
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        tmp_path.write_text(self.prometheus_text(success), encoding="utf-8")
+        os.replace(tmp_path, path)
+
+
+METRICS = RunMetrics()
+
+
+def report_run(success: bool, textfile: Optional[Path] = None) -> None:
+    """Log the end-of-run summary and export it to ``textfile`` when one is configured."""
+    summary = METRICS.summary()
+    counters = summary["counters"]
+    LOGGER.info(
+        "Run %s in %.1fs: %d reviews over %d pages (%.1f rows/s), %d retries, %d CSV bytes",
+        "finished" if success else "failed",
+        summary["duration_seconds"],
+        counters.get("reviews_fetched_total", 0),
+        counters.get("pages_fetched_total", 0),
+        summary["rows_per_second"],
+        counters.get("request_retries_total", 0),
+        counters.get("csv_bytes_written_total", 0),
+        extra={"summary": summary, "success": success},
+    )
+    if textfile is not None:
+        METRICS.write_textfile(textfile, success)
@@ -0,0 +1,195 @@
+"""Cluster near-duplicate review texts with MinHash signatures and LSH banding.
+
+Each text is normalized, split into character shingles and reduced to a
+``NUM_PERM``-value MinHash signature. The signature is cut into ``BANDS``
+bands; reviews sharing any band land in the same cluster, which for the
+defaults means an estimated Jaccard similarity of roughly 0.75 or more.
+Band buckets are kept in ``review_lsh_buckets`` so later loads join the
+clusters of earlier ones, and every row costs a constant amount of work.
+
+    python3 near_duplicates.py --db reviews.db          # label stored reviews that have no cluster yet
+"""
+from __future__ import annotations
+
+import argparse
+import hashlib
+import re
+import sqlite3
+import zlib
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from logging_utils import get_logger
+from review_db import REVIEW_COLUMNS, connect_database
+
+try:
+    import numpy as np
+except ImportError:  # only needed when near-duplicate clustering is enabled
+    np = None
+
+AVAILABLE = np is not None
+
+LOGGER = get_logger("googleplay.near_duplicates")
+
+NUM_PERM = 64
+BANDS = 8
+SHINGLE_SIZE = 4
+_PRIME = (1 << 61) - 1
+_TEXT_POSITION = REVIEW_COLUMNS.index("review_text")
+_CLUSTER_POSITION = REVIEW_COLUMNS.index("duplicate_cluster_id")
+_NON_WORD = re.compile(r"[\W_]+")
+
+BandKey = Tuple[int, int]
+
+
+def normalize(text: str) -> str:
+    """Lowercase and reduce punctuation and whitespace runs to single spaces."""
+    return _NON_WORD.sub(" ", text.lower()).strip()
+
+
+def shingles(text: str, size: int = SHINGLE_SIZE) -> List[str]:
+    if len(text) <= size:
+        return [text]
+    return list({text[i : i + size] for i in range(len(text) - size + 1)})
+
+
+class MinHasher:
+    """MinHash over character shingles using ``num_perm`` universal hash functions."""
+
+    def __init__(self, num_perm: int = NUM_PERM, bands: int = BANDS, seed: int = 1) -> None:
+        if np is None:
+            raise RuntimeError("near-duplicate clustering needs numpy; install it with `pip install numpy`")
+        if num_perm % bands:
+            raise ValueError("num_perm must be a multiple of bands")
+        rng = np.random.default_rng(seed)
+        # below 2**32, so a * hash + b stays inside uint64
+        self._a = rng.integers(1, 1 << 32, num_perm, dtype=np.uint64)
+        self._b = rng.integers(0, 1 << 32, num_perm, dtype=np.uint64)
+        self.bands = bands
+
+    def signature(self, text: Optional[str]) -> Optional["np.ndarray"]:
+        if not isinstance(text, str):
+            return None
+        normalized = normalize(text)
+        if not normalized:
+            return None
+        parts = shingles(normalized)
+        hashes = np.fromiter((zlib.crc32(part.encode("utf-8")) for part in parts), dtype=np.uint64, count=len(parts))
+        return ((hashes[:, None] * self._a + self._b) % _PRIME).min(axis=0)
+
+    def band_keys(self, text: Optional[str]) -> Optional[List[BandKey]]:
+        signature = self.signature(text)
+        if signature is None:
+            return None
+        return [
+            (band, int.from_bytes(hashlib.blake2b(rows.tobytes(), digest_size=8).digest(), "big", signed=True))
+            for band, rows in enumerate(signature.reshape(self.bands, -1))
+        ]
+
+
+class NearDuplicateIndex:
+    """Assign cluster ids to review texts of one app, persisting band buckets in ``review_lsh_buckets``.
+
+    A text joins the lowest existing cluster any of its bands collides with,
+    or starts a new one. Existing ids never change, so a text that bridges
+    two clusters does not merge them.
+    """
+
+    def __init__(self, conn: sqlite3.Connection, app_id: int, hasher: Optional[MinHasher] = None) -> None:
+        self.conn = conn
+        self.app_id = app_id
+        self.hasher = hasher or MinHasher()
+
+    def _lookup(self, keys: List[BandKey]) -> Dict[BandKey, int]:
+        found: Dict[BandKey, int] = {}
+        by_band: Dict[int, List[int]] = {}
+        for band, bucket in keys:
+            by_band.setdefault(band, []).append(bucket)
+        for band, buckets in by_band.items():
+            for start in range(0, len(buckets), 500):
+                chunk = buckets[start : start + 500]
+                rows = self.conn.execute(
+                    f"SELECT bucket, cluster_id FROM review_lsh_buckets WHERE app_id = ? AND band = ? "
+                    f"AND bucket IN ({', '.join('?' for _ in chunk)})",
+                    (self.app_id, band, *chunk),
+                )
+                found.update(((band, bucket), cluster_id) for bucket, cluster_id in rows)
+        return found
+
+    def assign(self, texts: Sequence[Optional[str]]) -> List[Optional[int]]:
+        """Cluster id for each text (None for texts with no words); call inside a write transaction."""
+        all_keys = [self.hasher.band_keys(text) for text in texts]
+        known = self._lookup([key for keys in all_keys if keys for key in keys])
+        next_id = self.conn.execute("SELECT IFNULL(MAX(cluster_id), 0) + 1 FROM review_lsh_buckets").fetchone()[0]
+        new_buckets: List[Tuple[int, int, int, int]] = []
+        clusters: List[Optional[int]] = []
+        for keys in all_keys:
+            if keys is None:
+                clusters.append(None)
+                continue
+            matches = [known[key] for key in keys if key in known]
+            if matches:
+                cluster_id = min(matches)
+            else:
+                cluster_id = next_id
+                next_id += 1
+            for key in keys:
+                if key not in known:
+                    known[key] = cluster_id
+                    new_buckets.append((self.app_id, key[0], key[1], cluster_id))
+            clusters.append(cluster_id)
+        self.conn.executemany(
+            "INSERT OR IGNORE INTO review_lsh_buckets (app_id, band, bucket, cluster_id) VALUES (?, ?, ?, ?)",
+            new_buckets,
+        )
+        return clusters
+
+    def label(self, rows: Sequence[Sequence]) -> List[Tuple]:
+        """Fill the ``duplicate_cluster_id`` field of ``REVIEW_COLUMNS`` tuples; usable as ``insert_reviews(label=...)``."""
+        rows = list(rows)
+        clusters = self.assign([row[_TEXT_POSITION] for row in rows])
+        return [(*row[:_CLUSTER_POSITION], cluster_id, *row[_CLUSTER_POSITION + 1 :]) for row, cluster_id in zip(rows, clusters)]
+
+
+def cluster_stored_reviews(conn: sqlite3.Connection, app_id: Optional[int] = None, batch_size: int = 10000) -> int:
+    """Label reviews already in the table that have no cluster id yet, oldest first; return how many were labelled."""
+    app_ids = [app_id] if app_id is not None else [row[0] for row in conn.execute("SELECT DISTINCT app_id FROM reviews ORDER BY app_id")]
+    labelled = 0
+    for current in app_ids:
+        index = NearDuplicateIndex(conn, current)
+        last_id = 0
+        while True:
+            rows = conn.execute(
+                "SELECT review_id, review_text FROM reviews "
+                "WHERE app_id = ? AND duplicate_cluster_id IS NULL AND review_id > ? ORDER BY review_id LIMIT ?",
+                (current, last_id, batch_size),
+            ).fetchall()
+            if not rows:
+                break
+            last_id = rows[-1][0]
+            with conn:
+                conn.execute("BEGIN IMMEDIATE")
+                clusters = index.assign([text for _, text in rows])
+                conn.executemany(
+                    "UPDATE reviews SET duplicate_cluster_id = ? WHERE review_id = ?",
+                    [(cluster_id, review_id) for (review_id, _), cluster_id in zip(rows, clusters) if cluster_id is not None],
+                )
+            labelled += sum(cluster_id is not None for cluster_id in clusters)
+            LOGGER.info("app %d: %d reviews labelled", current, labelled)
+    return labelled
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Assign near-duplicate cluster ids to stored reviews that have none")
+    parser.add_argument("--db", default="reviews.db", help="SQLite database (default: reviews.db)")
+    parser.add_argument("--app-id", type=int, help="Only label this app (default: all apps)")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    conn = connect_database(Path(args.db))
+    try:
+        cluster_stored_reviews(conn, args.app_id)
+    finally:
+        conn.close()
@@ -0,0 +1,324 @@
+"""Write per-period outputs and compute per-period aggregates on a process pool.
+
+Encoding and quoting hundreds of daily CSVs is pure-Python work that one
+core does slowly, so ``PeriodExporter`` hands the periods of a batch job to
+worker processes instead. Rows travel as packed column chunks (``pack_rows``):
+the text columns as lists, scores and timestamps as fixed-width arrays, and
+several small periods share one task, which keeps pickling and IPC cheap.
+
+Every worker also returns ``PeriodStats`` (counts, rating histogram, score
+and text-length sums) for the periods it handled. ``summarize_files`` computes
+the same figures straight from period CSVs for analysis:
+
+    stats = summarize_files(sorted(Path("output/schedule/daily").glob("*.csv")), workers=8)
+    stats_frame(stats)
+"""
+from __future__ import annotations
+
+import argparse
+import atexit
+import csv
+import multiprocessing
+import os
+import pickle
+import sys
+import threading
+import time
+from array import array
+from concurrent.futures import Future, ProcessPoolExecutor
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Dict, Iterable, List, NamedTuple, Optional, Sequence, TextIO, Tuple
+
+from logging_utils import get_logger
+from metrics import METRICS
+from records import Review
+from review_db import text_length
+from sinks import note_csv_written, reviews_table, write_csv_file
+
+try:
+    import pyarrow.parquet as pq
+except ImportError:  # only needed for output_format "parquet"
+    pq = None
+
+LOGGER = get_logger("googleplay.parallel_export")
+
+STATS_COLUMNS = ("period", "reviews", "mean_score", "mean_text_length", "score_1", "score_2", "score_3", "score_4", "score_5")
+
+_EPOCH = datetime(1970, 1, 1)
+_NO_TIME = -(2**63)
+_NO_SCORE = -1
+
+
+def _pack_scores(scores: Sequence) -> object:
+    if all(score is None or (type(score) is int and 0 <= score <= 127) for score in scores):
+        return array("b", [_NO_SCORE if score is None else score for score in scores])
+    return list(scores)
+
+
+def _pack_times(times: Sequence) -> object:
+    if not all(at is None or (type(at) is datetime and at.tzinfo is None) for at in times):
+        return list(times)
+    return array("q", [_NO_TIME if at is None else (at - _EPOCH) // timedelta(microseconds=1) for at in times])
+
+
+def pack_rows(rows: Sequence[Review]) -> bytes:
+    """Serialize ``rows`` column-wise; ``unpack_rows`` restores them exactly.
+
+    Scores and naive timestamps become ``array`` buffers instead of one
+    pickled object per cell; other values are kept as they are.
+    """
+    names, contents, scores, times, versions = zip(*rows) if rows else ((), (), (), (), ())
+    columns = (list(names), list(contents), _pack_scores(scores), _pack_times(times), list(versions))
+    return pickle.dumps(columns, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def unpack_rows(data: bytes) -> List[Review]:
+    names, contents, scores, times, versions = pickle.loads(data)
+    if isinstance(scores, array):
+        scores = [None if score == _NO_SCORE else score for score in scores]
+    if isinstance(times, array):
+        times = [None if at == _NO_TIME else _EPOCH + timedelta(microseconds=at) for at in times]
+    return [Review(*row) for row in zip(names, contents, scores, times, versions)]
+
+
+class PeriodStats(NamedTuple):
+    """Aggregates of one period's reviews; ``histogram`` counts the scores 1 to 5."""
+
+    label: str
+    reviews: int
+    scored: int
+    score_sum: int
+    histogram: Tuple[int, int, int, int, int]
+    text_length_sum: int
+
+    @property
+    def mean_score(self) -> Optional[float]:
+        return self.score_sum / self.scored if self.scored else None
+
+    @property
+    def mean_text_length(self) -> Optional[float]:
+        return self.text_length_sum / self.reviews if self.reviews else None
+
+
+def period_stats(label: str, reviews: Iterable[Tuple]) -> PeriodStats:
+    """Aggregate ``(content, score)`` pairs; scores may be ints or the strings a CSV holds."""
+    count = scored = score_sum = length_sum = 0
+    histogram = [0] * 5
+    for content, score in reviews:
+        count += 1
+        length_sum += text_length(content)
+        if score is None or score == "":
+            continue
+        score = int(score)
+        scored += 1
+        score_sum += score
+        if 1 <= score <= 5:
+            histogram[score - 1] += 1
+    return PeriodStats(label, count, scored, score_sum, tuple(histogram), length_sum)
+
+
+# --- worker side ----------------------------------------------------------------
+
+
+class ExportTask(NamedTuple):
+    """One period of a chunk: where its files go and its packed rows."""
+
+    label: str
+    csv_path: Optional[Path]
+    parquet_path: Optional[Path]
+    rows: bytes
+
+
+class ExportResult(NamedTuple):
+    stats: PeriodStats
+    csv_path: Optional[Path]
+    csv_bytes: int
+    parquet_path: Optional[Path]
+    parquet_bytes: int
+    csv_seconds: float
+    parquet_seconds: float
+
+
+def export_chunk(tasks: List[ExportTask]) -> List[ExportResult]:
+    """Worker entry point: write every period of a chunk and aggregate its rows."""
+    results: List[ExportResult] = []
+    for task in tasks:
+        rows = unpack_rows(task.rows)
+        csv_bytes = parquet_bytes = 0
+        csv_seconds = parquet_seconds = 0.0
+        if task.csv_path is not None:
+            started = time.perf_counter()
+            csv_bytes = write_csv_file(rows, task.csv_path)
+            csv_seconds = time.perf_counter() - started
+        if task.parquet_path is not None:
+            started = time.perf_counter()
+            pq.write_table(reviews_table(rows), task.parquet_path, compression="zstd")
+            parquet_bytes = task.parquet_path.stat().st_size
+            parquet_seconds = time.perf_counter() - started
+        stats = period_stats(task.label, ((row.content, row.score) for row in rows))
+        results.append(ExportResult(stats, task.csv_path, csv_bytes, task.parquet_path, parquet_bytes, csv_seconds, parquet_seconds))
+    return results
+
+
+def summarize_file(path: Path) -> PeriodStats:
+    """Aggregate one period or merged CSV; placeholder files of empty periods count as zero reviews."""
+    csv.field_size_limit(sys.maxsize)
+    with path.open("r", encoding="utf-8-sig", newline="") as f:
+        reader = csv.DictReader(f)
+        if reader.fieldnames is None or "content" not in reader.fieldnames:
+            return period_stats(path.stem, ())
+        return period_stats(path.stem, ((row["content"], row["score"]) for row in reader))
+
+
+# --- parent side ----------------------------------------------------------------
+
+_POOLS: Dict[int, ProcessPoolExecutor] = {}
+_POOLS_LOCK = threading.Lock()
+
+
+def process_pool(workers: int) -> ProcessPoolExecutor:
+    """The run's shared pool of ``workers`` processes, started on first use.
+
+    Workers are spawned rather than forked: the runners fork from threads
+    that may hold the logging or metrics locks.
+    """
+    with _POOLS_LOCK:
+        pool = _POOLS.get(workers)
+        if pool is None:
+            pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+            _POOLS[workers] = pool
+        return pool
+
+
+def shutdown_pools() -> None:
+    with _POOLS_LOCK:
+        for pool in _POOLS.values():
+            pool.shutdown(cancel_futures=True)
+        _POOLS.clear()
+
+
+atexit.register(shutdown_pools)
+
+
+class PeriodExporter:
+    """Queue a job's periods for the process pool, ``chunk_rows`` rows (or one large period) per task.
+
+    Files are written exactly as ``save_to_csv`` and ``ParquetDataset.write_period``
+    write them; metrics and log lines are recorded here as the chunks finish.
+    The workers' per-period aggregates are returned by ``close`` and, with a
+    ``summary_path``, written there as one ``STATS_COLUMNS`` CSV.
+    """
+
+    def __init__(self, workers: int, chunk_rows: int = 20_000, summary_path: Optional[Path] = None) -> None:
+        self.workers = max(1, workers)
+        self.chunk_rows = max(1, chunk_rows)
+        self.summary_path = summary_path
+        self._chunk: List[ExportTask] = []
+        self._chunk_size = 0
+        self._futures: List[Future] = []
+        self._rows: Dict[str, int] = {}
+
+    def submit(self, label: str, rows: List[Review], csv_path: Optional[Path] = None, parquet_path: Optional[Path] = None) -> None:
+        self._chunk.append(ExportTask(label, csv_path, parquet_path, pack_rows(rows)))
+        self._rows[label] = len(rows)
+        # every task costs a round trip, so tiny periods travel together
+        self._chunk_size += len(rows) + 1
+        if self._chunk_size >= self.chunk_rows:
+            self._dispatch()
+
+    def _dispatch(self) -> None:
+        if self._chunk:
+            self._futures.append(process_pool(self.workers).submit(export_chunk, self._chunk))
+        self._chunk = []
+        self._chunk_size = 0
+
+    def abort(self) -> None:
+        for future in self._futures:
+            future.cancel()
+        self._futures = []
+        self._chunk = []
+        self._chunk_size = 0
+
+    def close(self) -> List[PeriodStats]:
+        """Wait for every queued period and return their aggregates in submission order."""
+        self._dispatch()
+        stats: List[PeriodStats] = []
+        try:
+            for future in self._futures:
+                for result in future.result():
+                    self._record(result)
+                    stats.append(result.stats)
+        finally:
+            self.abort()
+        if self.summary_path is not None:
+            with self.summary_path.open("w", encoding="utf-8", newline="") as f:
+                write_stats(stats, f)
+            LOGGER.info("wrote the per-period summary %s", self.summary_path, extra={"periods": len(stats)})
+        return stats
+
+    def _record(self, result: ExportResult) -> None:
+        rows = self._rows.get(result.stats.label, result.stats.reviews)
+        if result.csv_path is not None:
+            METRICS.inc("write_csv_seconds_total", result.csv_seconds)
+            note_csv_written(result.csv_path, result.csv_bytes, rows)
+        if result.parquet_path is not None:
+            METRICS.inc("write_parquet_seconds_total", result.parquet_seconds)
+            METRICS.inc("parquet_files_written_total")
+            METRICS.inc("parquet_bytes_written_total", result.parquet_bytes)
+            if rows:
+                LOGGER.info("created %s", result.parquet_path, extra={"rows": rows})
+            else:
+                LOGGER.warning("%s No reviews found; an empty file was created", result.parquet_path)
+
+
+def write_stats(stats: Sequence[PeriodStats], f: TextIO) -> None:
+    writer = csv.writer(f)
+    writer.writerow(STATS_COLUMNS)
+    for item in stats:
+        mean_score = f"{item.mean_score:.4f}" if item.mean_score is not None else ""
+        mean_length = f"{item.mean_text_length:.2f}" if item.mean_text_length is not None else ""
+        writer.writerow([item.label, item.reviews, mean_score, mean_length, *item.histogram])
+
+
+def summarize_files(paths: Sequence[Path], workers: Optional[int] = None) -> List[PeriodStats]:
+    """``summarize_file`` for every path, on ``workers`` processes (default: all cores)."""
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or len(paths) < 2:
+        return [summarize_file(path) for path in paths]
+    chunksize = max(1, len(paths) // (workers * 4))
+    return list(process_pool(workers).map(summarize_file, paths, chunksize=chunksize))
+
+
+def stats_frame(stats: Sequence[PeriodStats]):
+    """``pandas.DataFrame`` with one row per period: counts, means and the score histogram."""
+    import pandas as pd
+
+    records = [(item.label, item.reviews, item.mean_score, item.mean_text_length, *item.histogram) for item in stats]
+    return pd.DataFrame(records, columns=list(STATS_COLUMNS))
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Per-file review counts, mean score and text length of period CSVs")
+    parser.add_argument("inputs", nargs="+", help="CSV files or directories of period CSVs")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: all cores)")
+    parser.add_argument("--output", default=None, help="Write the table to this CSV instead of stdout")
+    return parser.parse_args()
+
+
+def main() -> None:
+    args = parse_args()
+    paths: List[Path] = []
+    for item in args.inputs:
+        path = Path(item)
+        paths.extend(sorted(path.glob("*.csv")) if path.is_dir() else [path])
+    stats = summarize_files(paths, args.workers)
+    if args.output is None:
+        write_stats(stats, sys.stdout)
+        return
+    with open(args.output, "w", encoding="utf-8", newline="") as f:
+        write_stats(stats, f)
+
+
+if __name__ == "__main__":
+    main()
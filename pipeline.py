@@ -0,0 +1,186 @@
+"""Pipeline core shared by every mode: source -> transforms -> bucket -> sink.
+
+- a *source* yields batches of rows (``collected`` for one batch holding a
+  whole fetch, ``replayed`` for page-by-page streaming, or any iterable such
+  as the loader's CSV chunks),
+- *transforms* rewrite each batch (period filters, truncation, preparing
+  database rows),
+- a *bucket* splits a batch into ``(period, rows)`` pairs,
+- the *sink* stores them (``sinks.JobSink`` fans out to CSV, Parquet and the
+  review database; ``sinks.SqliteReviewSink`` writes the database alone).
+
+The Google Play sources and the config run loop built on it are in
+``scraper.py``.
+"""
+from __future__ import annotations
+
+import json
+from bisect import bisect_right
+from datetime import date
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from checkpoints import FetchState
+from metrics import METRICS
+from records import Review
+from sinks import Period
+
+Transform = Callable[[List[Review]], List[Review]]
+Bucket = Callable[[List[Review]], Iterable[Tuple[Any, List[Review]]]]
+# sinks.JobSink, sinks.SqliteReviewSink: write(rows), write_period(period, rows), close(), abort()
+Sink = Any
+
+
+def load_config(path: Path) -> Dict:
+    with path.open("r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def ensure_output_dir(path: Path) -> None:
+    path.mkdir(parents=True, exist_ok=True)
+
+
+def ensure_subdir(base: Path, *parts: str) -> Path:
+    target = base.joinpath(*parts)
+    ensure_output_dir(target)
+    return target
+
+
+# --- sources -----------------------------------------------------------------
+
+
+def collected(state: FetchState, pages: Iterable[List[Review]]) -> Iterator[List[Review]]:
+    """Batch source: drain ``pages`` and yield every row ``state`` holds, cached prefix included, as one batch."""
+    for _ in pages:
+        pass
+    yield state.rows
+
+
+def replayed(state: FetchState, pages: Iterable[List[Review]]) -> Iterator[List[Review]]:
+    """Streaming source: the rows ``state`` already holds (a resumed checkpoint), then each new page.
+
+    ``pages`` must be fetched with ``keep_rows=False``; only the page in
+    flight is held in memory.
+    """
+    rows, state.rows = state.rows, []
+    yield rows
+    yield from pages
+
+
+# --- transforms and buckets ----------------------------------------------------
+
+
+def filter_rows_by_period(
+    rows: List[Review],
+    period_start: date,
+    period_end: date,
+) -> List[Review]:
+    filtered: List[Review] = []
+    with METRICS.timer("filter"):
+        for row in rows:
+            comment_date = row.day
+            if comment_date is None:
+                continue
+            if period_start <= comment_date <= period_end:
+                filtered.append(row)
+    return filtered
+
+
+def bucket_rows_by_period(
+    rows: List[Review],
+    periods: List[Period],
+) -> List[List[Review]]:
+    """Assign every row to its period in one pass; ``periods`` must be sorted and non-overlapping."""
+    starts = [period_start for period_start, _ in periods]
+    buckets: List[List[Review]] = [[] for _ in periods]
+    with METRICS.timer("filter"):
+        for row in rows:
+            comment_date = row.day
+            if comment_date is None:
+                continue
+            index = bisect_right(starts, comment_date) - 1
+            if index >= 0 and comment_date <= periods[index][1]:
+                buckets[index].append(row)
+    return buckets
+
+
+def parse_week_start(value: Optional[str]) -> int:
+    """Weekday a week starts on (0 = Monday) from ``week_starts_on``: a name or a number 0-6."""
+    if value is None:
+        return 0
+    value_str = str(value).strip()
+    if value_str.isdigit():
+        num = int(value_str)
+        if 0 <= num <= 6:
+            return num
+        return 0
+    mapping = {
+        "monday": 0,
+        "tuesday": 1,
+        "wednesday": 2,
+        "thursday": 3,
+        "friday": 4,
+        "saturday": 5,
+        "sunday": 6,
+    }
+    return mapping.get(value_str.lower(), 0)
+
+
+def within(period_start: date, period_end: date) -> Transform:
+    """Transform keeping the rows dated inside ``period_start``..``period_end``."""
+    return lambda rows: filter_rows_by_period(rows, period_start, period_end)
+
+
+def by_period(periods: List[Period]) -> Bucket:
+    """Bucket yielding every period with its rows, empty periods included."""
+    return lambda rows: zip(periods, bucket_rows_by_period(rows, periods))
+
+
+def as_one(key: Any) -> Bucket:
+    """Bucket handing the whole batch to the sink under ``key``."""
+    return lambda rows: [(key, rows)]
+
+
+# --- pipeline ----------------------------------------------------------------
+
+
+class Pipeline:
+    """One job's stages: ``source`` yields batches, ``transforms`` rewrite each one in order,
+    ``bucket`` splits it into ``(period, rows)`` pairs for ``sink.write_period``.
+
+    Without a bucket every batch goes to ``sink.write``, which routes rows on
+    its own; that is how streamed jobs run. The sink is closed once the
+    source is drained and aborted if any stage fails.
+    """
+
+    def __init__(
+        self,
+        source: Iterable[List[Review]],
+        sink: Sink,
+        transforms: Sequence[Transform] = (),
+        bucket: Optional[Bucket] = None,
+    ) -> None:
+        self.source = source
+        self.sink = sink
+        self.transforms = list(transforms)
+        self.bucket = bucket
+
+    def run(self) -> int:
+        """Run the stages and return how many rows reached the sink."""
+        written = 0
+        try:
+            for batch in self.source:
+                for transform in self.transforms:
+                    batch = transform(batch)
+                if self.bucket is None:
+                    self.sink.write(batch)
+                    written += len(batch)
+                    continue
+                for period, rows in self.bucket(batch):
+                    self.sink.write_period(period, rows)
+                    written += len(rows)
+        except BaseException:
+            self.sink.abort()
+            raise
+        self.sink.close()
+        return written
@@ -0,0 +1,51 @@
+"""Compact record type for scraped reviews."""
+from __future__ import annotations
+
+import hashlib
+from datetime import date, datetime
+from typing import Dict, NamedTuple, Optional, Tuple
+
+# CSV column order; matches the keys the scraper has always written
+REVIEW_FIELDS: Tuple[str, ...] = ("name", "content", "score", "at", "appversion")
+
+
+class Review(NamedTuple):
+    name: Optional[str]
+    content: Optional[str]
+    score: Optional[int]
+    at: Optional[datetime]
+    appversion: Optional[str]
+
+    @property
+    def day(self) -> Optional[date]:
+        at = self.at
+        if isinstance(at, datetime):
+            return at.date()
+        if isinstance(at, date):
+            return at
+        return None
+
+
+def review_from_gps(data: Dict) -> Review:
+    """Build a record from one item returned by ``gps.reviews``."""
+    return Review(
+        data.get("userName"),
+        data.get("content"),
+        data.get("score"),
+        data.get("at"),
+        data.get("appVersion"),
+    )
+
+
+def csv_cell(value) -> str:
+    """A field as ``csv.writer`` writes it, and so as it reads back from a period CSV."""
+    return "" if value is None else str(value)
+
+
+def review_digest(name: str, at: str, content: str) -> bytes:
+    """Identity of a review across files and runs: the fields of ``checkpoints.review_key`` in CSV form."""
+    return hashlib.blake2b("\x1f".join((name, at, content)).encode("utf-8"), digest_size=16).digest()
+
+
+def row_digest(row: Review) -> bytes:
+    return review_digest(csv_cell(row.name), csv_cell(row.at), csv_cell(row.content))
@@ -0,0 +1,173 @@
+"""Shared pacing, retry and concurrency control for calls to the Play store."""
+from __future__ import annotations
+
+import random
+import threading
+import time
+from collections import deque
+from typing import Callable, Deque, Dict, Optional, Tuple, Type, TypeVar
+
+from logging_utils import get_logger
+from metrics import METRICS
+
+LOGGER = get_logger("googleplay.request_governor")
+
+PLAY_HOST = "play.google.com"
+
+T = TypeVar("T")
+
+
+class TokenBucket:
+    """Allow ``rate`` requests per second on average, with bursts of up to ``burst``."""
+
+    def __init__(self, rate: float, burst: int) -> None:
+        self.rate = rate
+        self.capacity = max(1, burst)
+        self._tokens = float(self.capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> float:
+        """Take one token, sleeping until it is available; return the time waited."""
+        if self.rate <= 0:
+            return 0.0
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0.0
+        if wait:
+            time.sleep(wait)
+        return wait
+
+
+class AdaptiveLimit:
+    """Concurrency limit that halves when the recent error rate is high and grows back slowly."""
+
+    def __init__(self, maximum: int, window: int = 20, error_threshold: float = 0.2, recover_after: int = 10) -> None:
+        self.maximum = max(1, maximum)
+        self.limit = self.maximum
+        self.error_threshold = error_threshold
+        self.recover_after = recover_after
+        self.min_samples = min(5, max(1, window))
+        self._outcomes: Deque[bool] = deque(maxlen=max(1, window))
+        self._in_flight = 0
+        self._successes = 0
+        self._cond = threading.Condition()
+
+    def __enter__(self) -> "AdaptiveLimit":
+        with self._cond:
+            while self._in_flight >= self.limit:
+                self._cond.wait()
+            self._in_flight += 1
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        with self._cond:
+            self._in_flight -= 1
+            self._cond.notify_all()
+
+    def record(self, ok: bool) -> None:
+        with self._cond:
+            self._outcomes.append(ok)
+            if ok:
+                self._successes += 1
+                if self.limit < self.maximum and self._successes >= self.recover_after:
+                    self.limit += 1
+                    self._successes = 0
+                    LOGGER.info("Request concurrency raised to %d", self.limit)
+                return
+            self._successes = 0
+            errors = self._outcomes.count(False)
+            samples = len(self._outcomes)
+            # a single early failure is not a trend
+            if self.limit > 1 and samples >= self.min_samples and errors / samples > self.error_threshold:
+                self.limit = max(1, self.limit // 2)
+                # judge the reduced limit on fresh outcomes only
+                self._outcomes.clear()
+                LOGGER.warning("Error rate %d/%d; request concurrency lowered to %d", errors, samples, self.limit)
+
+
+class RequestGovernor:
+    """Rate-limit, retry and bound the concurrency of store requests.
+
+    One token bucket is kept per host. Retryable failures are retried with
+    exponential backoff and full jitter; a high error rate lowers the number
+    of requests allowed in flight across all worker threads.
+    """
+
+    def __init__(
+        self,
+        rate: float = 5.0,
+        burst: int = 5,
+        max_retries: int = 5,
+        backoff_base: float = 1.0,
+        backoff_max: float = 60.0,
+        max_concurrency: int = 4,
+        retry_on: Tuple[Type[BaseException], ...] = (OSError,),
+        give_up_on: Tuple[Type[BaseException], ...] = (),
+        sleep: Callable[[float], None] = time.sleep,
+    ) -> None:
+        self.rate = rate
+        self.burst = burst
+        self.max_retries = max(0, max_retries)
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.retry_on = retry_on
+        self.give_up_on = give_up_on
+        self.limit = AdaptiveLimit(max_concurrency)
+        self.retries = 0
+        self._sleep = sleep
+        self._buckets: Dict[str, TokenBucket] = {}
+        self._lock = threading.Lock()
+
+    def bucket(self, host: str) -> TokenBucket:
+        with self._lock:
+            if host not in self._buckets:
+                self._buckets[host] = TokenBucket(self.rate, self.burst)
+            return self._buckets[host]
+
+    def backoff(self, attempt: int) -> float:
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    def call(self, fn: Callable[..., T], *args, host: str = PLAY_HOST, **kwargs) -> T:
+        attempt = 0
+        while True:
+            with self.limit:
+                waited = self.bucket(host).acquire()
+                if waited:
+                    METRICS.inc("rate_limit_wait_seconds_total", waited)
+                try:
+                    result = fn(*args, **kwargs)
+                except self.give_up_on:
+                    raise
+                except self.retry_on as exc:
+                    self.limit.record(False)
+                    if attempt >= self.max_retries:
+                        raise
+                    error: Optional[BaseException] = exc
+                else:
+                    self.limit.record(True)
+                    return result
+            delay = self.backoff(attempt)
+            attempt += 1
+            with self._lock:
+                self.retries += 1
+            METRICS.inc("request_retries_total")
+            LOGGER.warning("%s request failed (%s); retry %d/%d in %.1fs", host, error, attempt, self.max_retries, delay)
+            self._sleep(delay)
+
+
+def governor_from_config(config: Dict, retry_on: Tuple[Type[BaseException], ...], give_up_on: Tuple[Type[BaseException], ...] = ()) -> RequestGovernor:
+    settings = config.get("rate_limit", {})
+    return RequestGovernor(
+        rate=float(settings.get("requests_per_second", 5.0)),
+        burst=int(settings.get("burst", 5)),
+        max_retries=int(settings.get("max_retries", 5)),
+        backoff_base=float(settings.get("backoff_base", 1.0)),
+        backoff_max=float(settings.get("backoff_max", 60.0)),
+        max_concurrency=int(settings.get("max_concurrency", max(1, int(config.get("workers", 1))))),
+        retry_on=retry_on,
+        give_up_on=give_up_on,
+    )
@@ -0,0 +1,133 @@
+"""Per-run cache of fetched review streams shared by config entries."""
+from __future__ import annotations
+
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Callable, Iterator, List, Optional, Set, Tuple
+
+from checkpoints import CheckpointKey, CheckpointStore, FetchState
+from logging_utils import get_logger
+from records import Review
+
+LOGGER = get_logger("googleplay.review_cache")
+
+PageCallback = Callable[[FetchState, List[Review]], None]
+
+
+class ReviewCache:
+    """LRU map from (package, lang, country, sort) to the pages fetched so far.
+
+    A later entry for the same stream continues from the cached ``FetchState``,
+    so it is served from the cached prefix and only downloads deeper pages.
+    Entries in use are never evicted; ``on_evict`` is called for every entry
+    that leaves the cache.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 8,
+        max_rows: int = 2_000_000,
+        on_evict: Optional[Callable[[CheckpointKey], None]] = None,
+    ) -> None:
+        self.max_entries = max_entries
+        self.max_rows = max_rows
+        self.on_evict = on_evict
+        self._entries: "OrderedDict[CheckpointKey, FetchState]" = OrderedDict()
+        self._in_use: Set[CheckpointKey] = set()
+        self._lock = threading.Lock()
+
+    def acquire(self, key: CheckpointKey) -> Optional[FetchState]:
+        with self._lock:
+            self._in_use.add(key)
+            state = self._entries.get(key)
+            if state is not None:
+                self._entries.move_to_end(key)
+            return state
+
+    def release(self, key: CheckpointKey, state: Optional[FetchState]) -> bool:
+        """Store ``state`` and return whether it is still cached.
+
+        ``None`` drops the entry without calling ``on_evict``, leaving its
+        checkpoint in place after a failed fetch.
+        """
+        with self._lock:
+            self._in_use.discard(key)
+            if state is None:
+                self._entries.pop(key, None)
+                return False
+            self._entries[key] = state
+            self._entries.move_to_end(key)
+            evicted = self._evict()
+            retained = key in self._entries
+        self._notify(evicted)
+        return retained
+
+    def clear(self) -> None:
+        with self._lock:
+            evicted = [key for key in self._entries if key not in self._in_use]
+            for key in evicted:
+                del self._entries[key]
+        self._notify(evicted)
+
+    def _evict(self) -> List[CheckpointKey]:
+        evicted: List[CheckpointKey] = []
+        total_rows = sum(len(state.rows) for state in self._entries.values())
+        for key in list(self._entries):
+            if len(self._entries) <= self.max_entries and total_rows <= self.max_rows:
+                break
+            if key in self._in_use:
+                continue
+            total_rows -= len(self._entries.pop(key).rows)
+            evicted.append(key)
+        return evicted
+
+    def _notify(self, evicted: List[CheckpointKey]) -> None:
+        if self.on_evict is None:
+            return
+        for key in evicted:
+            self.on_evict(key)
+
+
+def page_budget(state: FetchState, count: int, max_pages: int) -> int:
+    """Translate a ``count`` x ``max_pages`` request into a page limit for ``state``."""
+    wanted = count * max_pages
+    missing = max(0, wanted - state.total)
+    return state.pages + -(-missing // max(1, count))
+
+
+@contextmanager
+def fetch_session(
+    key: CheckpointKey,
+    count: int,
+    label: str,
+    checkpoints: Optional[CheckpointStore] = None,
+    cache: Optional[ReviewCache] = None,
+    resume: bool = False,
+) -> Iterator[Tuple[FetchState, Optional[PageCallback]]]:
+    """Yield the state to fetch ``key`` with: cached, resumed from a checkpoint, or fresh.
+
+    The checkpoint is cleared once the fetch succeeds and the state has left
+    the cache; on failure it is kept for ``--resume``.
+    """
+    state = cache.acquire(key) if cache is not None else None
+    if state is not None:
+        LOGGER.info("[%s] Reusing %d cached reviews from %d pages (oldest %s)", label, state.total, state.pages, state.oldest)
+    elif checkpoints is not None:
+        state = checkpoints.start(key, count, resume)
+        if state.pages:
+            LOGGER.info("[%s] Resuming from checkpoint: %d pages, %d reviews, oldest %s", label, state.pages, state.total, state.oldest)
+    else:
+        state = FetchState()
+    on_page = checkpoints.page_saver(key) if checkpoints is not None else None
+
+    try:
+        yield state, on_page
+    except BaseException:
+        if cache is not None:
+            cache.release(key, None)
+        raise
+
+    retained = cache.release(key, state) if cache is not None else False
+    if checkpoints is not None and not retained:
+        checkpoints.clear(key)
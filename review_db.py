@@ -0,0 +1,164 @@
+"""Shared helpers for the SQLite review database (``reviews.db``)."""
+from __future__ import annotations
+
+import hashlib
+import sqlite3
+from pathlib import Path
+from typing import Callable, Iterable, List, Optional, Sequence, Tuple
+
+SCHEMA_PATH = Path(__file__).resolve().parent / "create_tables.sql"
+PLATFORM = "google_play"
+
+# column order of REVIEW_INSERT parameters
+REVIEW_COLUMNS = (
+    "app_id",
+    "user_name",
+    "rating",
+    "review_text",
+    "review_date",
+    "year_month",
+    "app_version",
+    "text_length",
+    "content_hash",
+    "duplicate_cluster_id",
+)
+
+# rows already stored under the natural key are skipped, so loads can be repeated
+REVIEW_INSERT = (
+    f"INSERT INTO reviews ({', '.join(REVIEW_COLUMNS)}) "
+    f"VALUES ({', '.join('?' for _ in REVIEW_COLUMNS)}) "
+    "ON CONFLICT DO NOTHING"
+)
+
+
+def text_length(content: Optional[str]) -> int:
+    return len(content.split()) if content else 0
+
+
+def content_hash(content: Optional[str]) -> str:
+    return hashlib.sha1((content or "").encode("utf-8")).hexdigest()
+
+
+def _columns(conn: sqlite3.Connection, table: str) -> Sequence[str]:
+    return [row[1] for row in conn.execute(f"PRAGMA table_info({table})")]
+
+
+def migrate_reviews_table(conn: sqlite3.Connection) -> None:
+    """Bring a ``reviews`` table created by an older ``create_tables.sql`` up to date.
+
+    Adds and fills ``content_hash`` and drops duplicate rows so that the
+    unique index in ``create_tables.sql`` can be built, and adds the
+    ``duplicate_cluster_id`` column.
+    """
+    columns = _columns(conn, "reviews")
+    if not columns:
+        return
+    if "duplicate_cluster_id" not in columns:
+        with conn:
+            conn.execute("ALTER TABLE reviews ADD COLUMN duplicate_cluster_id INTEGER")
+    if "content_hash" in columns:
+        return
+    with conn:
+        conn.execute("ALTER TABLE reviews ADD COLUMN content_hash TEXT")
+        conn.create_function("content_hash", 1, content_hash, deterministic=True)
+        conn.execute("UPDATE reviews SET content_hash = content_hash(review_text)")
+        conn.execute(
+            "DELETE FROM reviews WHERE review_id NOT IN ("
+            "SELECT MIN(review_id) FROM reviews "
+            "GROUP BY app_id, IFNULL(user_name, ''), IFNULL(review_date, ''), content_hash)"
+        )
+
+
+def rebuild_monthly_stats(conn: sqlite3.Connection) -> None:
+    """Recompute ``review_monthly_stats`` from the ``reviews`` table."""
+    with conn:
+        conn.execute("DELETE FROM review_monthly_stats")
+        conn.execute(
+            "INSERT INTO review_monthly_stats (app_id, year_month, review_count, rating_count, rating_sum) "
+            "SELECT app_id, IFNULL(year_month, ''), COUNT(*), COUNT(rating), IFNULL(SUM(rating), 0) "
+            "FROM reviews GROUP BY app_id, IFNULL(year_month, '')"
+        )
+
+
+def rebuild_daily_stats(conn: sqlite3.Connection) -> None:
+    """Recompute ``review_daily_stats`` from the ``reviews`` table."""
+    with conn:
+        conn.execute("DELETE FROM review_daily_stats")
+        conn.execute(
+            "INSERT INTO review_daily_stats ("
+            "app_id, day, app_version, review_count, rating_count, rating_sum, "
+            "rating_1, rating_2, rating_3, rating_4, rating_5, text_length_sum, text_length_sq_sum) "
+            "SELECT app_id, IFNULL(substr(review_date, 1, 10), ''), IFNULL(app_version, ''), "
+            "COUNT(*), COUNT(rating), IFNULL(SUM(rating), 0), "
+            "SUM(rating IS 1), SUM(rating IS 2), SUM(rating IS 3), SUM(rating IS 4), SUM(rating IS 5), "
+            "IFNULL(SUM(text_length), 0), IFNULL(SUM(text_length * text_length), 0) "
+            "FROM reviews GROUP BY 1, 2, 3"
+        )
+
+
+def rebuild_search_index(conn: sqlite3.Connection) -> None:
+    """Re-index ``reviews_fts`` from the ``reviews`` table."""
+    with conn:
+        conn.execute("INSERT INTO reviews_fts (reviews_fts) VALUES ('rebuild')")
+
+
+def apply_schema(conn: sqlite3.Connection, schema_sql: Optional[str] = None) -> None:
+    """Create or upgrade the schema from ``create_tables.sql``."""
+    migrate_reviews_table(conn)
+    had_rollup = bool(_columns(conn, "review_monthly_stats"))
+    had_daily_rollup = bool(_columns(conn, "review_daily_stats"))
+    had_search_index = bool(_columns(conn, "reviews_fts"))
+    conn.executescript(schema_sql if schema_sql is not None else SCHEMA_PATH.read_text(encoding="utf-8"))
+    # the triggers only see new rows; fill the rollups and the search index once for existing data
+    if not had_rollup:
+        rebuild_monthly_stats(conn)
+    if not had_daily_rollup:
+        rebuild_daily_stats(conn)
+    if not had_search_index:
+        rebuild_search_index(conn)
+
+
+def connect_database(path: Path) -> sqlite3.Connection:
+    """Open ``reviews.db`` in WAL mode and make sure the schema is current."""
+    conn = sqlite3.connect(str(path), timeout=60)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    apply_schema(conn)
+    return conn
+
+
+def resolve_app_id(conn: sqlite3.Connection, package: str) -> int:
+    with conn:
+        found = conn.execute(
+            "SELECT app_id FROM apps WHERE app_name = ? AND platform = ?",
+            (package, PLATFORM),
+        ).fetchone()
+        if found is not None:
+            return found[0]
+        return conn.execute(
+            "INSERT INTO apps (app_name, platform) VALUES (?, ?)",
+            (package, PLATFORM),
+        ).lastrowid
+
+
+def high_water_mark(conn: sqlite3.Connection, app_id: int) -> Optional[str]:
+    """Newest ``review_date`` stored for ``app_id``."""
+    return conn.execute("SELECT MAX(review_date) FROM reviews WHERE app_id = ?", (app_id,)).fetchone()[0]
+
+
+def insert_reviews(
+    conn: sqlite3.Connection,
+    rows: Iterable[Sequence],
+    label: Optional[Callable[[Sequence[Sequence]], List[Tuple]]] = None,
+) -> int:
+    """Insert ``REVIEW_COLUMNS`` tuples in one transaction; return how many were new.
+
+    ``label`` (e.g. ``NearDuplicateIndex.label``) may rewrite the rows first;
+    it runs inside the same write transaction.
+    """
+    with conn:
+        if label is not None:
+            conn.execute("BEGIN IMMEDIATE")
+            rows = label(list(rows))
+        # rowcount leaves out the rollup trigger's writes, which total_changes would include
+        return conn.executemany(REVIEW_INSERT, rows).rowcount
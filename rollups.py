@@ -0,0 +1,232 @@
+"""Daily, weekly and monthly review time series served from the ``review_daily_stats`` rollup.
+
+The rollup holds one cell per (app, day, app version) with the review count,
+the rating count, sum and histogram and the sum and sum of squares of the
+text length (in words). Triggers on ``reviews`` keep it current, so a query
+sums a few cells per period instead of scanning reviews. Weeks (starting on
+``week_starts_on``, as in ``periodic.json``) and months are summed from the
+daily cells:
+
+    weekly = rollup_frame("reviews.db", "com.openai.chatgpt", "weekly", week_starts_on="sunday")
+    rollup_series("reviews.db", "mean_rating", "com.openai.chatgpt", "monthly", start="2025-06-01")
+    rollup_frame("reviews.db", "com.openai.chatgpt", "daily", by_version=True)
+"""
+from __future__ import annotations
+
+import argparse
+import sqlite3
+from datetime import date
+from pathlib import Path
+from typing import List, Optional, Union
+
+from pipeline import parse_week_start
+
+try:
+    import numpy as np
+    import pandas as pd
+except ImportError:  # only needed for the frames and series
+    np = pd = None
+
+FREQUENCIES = ("daily", "weekly", "monthly")
+
+# summed per period; the derived columns are computed from them
+SUM_COLUMNS = (
+    "reviews",
+    "rating_count",
+    "rating_sum",
+    "score_1",
+    "score_2",
+    "score_3",
+    "score_4",
+    "score_5",
+    "text_length_sum",
+    "text_length_sq_sum",
+)
+DERIVED_COLUMNS = ("mean_rating", "low_share", "high_share", "mean_text_length", "text_length_std")
+
+_SUMS = (
+    "SUM(review_count), SUM(rating_count), SUM(rating_sum), "
+    "SUM(rating_1), SUM(rating_2), SUM(rating_3), SUM(rating_4), SUM(rating_5), "
+    "SUM(text_length_sum), SUM(text_length_sq_sum)"
+)
+
+Database = Union[str, Path, sqlite3.Connection]
+DateLike = Union[str, date, None]
+
+
+def period_starts(days: "pd.DatetimeIndex", frequency: str, week_start: int = 0) -> "pd.DatetimeIndex":
+    """First day of the period each of ``days`` falls in; weeks start on ``week_start`` (0 = Monday)."""
+    if frequency == "daily":
+        return days
+    if frequency == "weekly":
+        return days - pd.to_timedelta((days.weekday - week_start) % 7, unit="D")
+    if frequency == "monthly":
+        return days.to_period("M").to_timestamp()
+    raise ValueError(f"unsupported frequency: {frequency}")
+
+
+def open_read_only(path: Path) -> sqlite3.Connection:
+    """Query connection that neither changes the journal mode nor re-runs the schema."""
+    if not path.exists():
+        raise FileNotFoundError(path)
+    return sqlite3.connect(f"{path.resolve().as_uri()}?mode=ro", uri=True)
+
+
+def _as_day(value: DateLike) -> Optional[str]:
+    if value is None:
+        return None
+    return value.isoformat() if isinstance(value, date) else str(value)[:10]
+
+
+def query_days(
+    conn: sqlite3.Connection,
+    package: Optional[str] = None,
+    start: DateLike = None,
+    end: DateLike = None,
+    app_version: Optional[str] = None,
+    by_version: bool = False,
+) -> List[tuple]:
+    """``(day[, app_version], *SUM_COLUMNS)`` rows in day order, for one app or all of them.
+
+    ``start``/``end`` bound the days (inclusive). Reviews without a date are
+    left out.
+    """
+    where = ["day != ''"]
+    params: list = []
+    if package is not None:
+        where.append("app_id IN (SELECT app_id FROM apps WHERE app_name = ?)")
+        params.append(package)
+    if start is not None:
+        where.append("day >= ?")
+        params.append(_as_day(start))
+    if end is not None:
+        where.append("day <= ?")
+        params.append(_as_day(end))
+    if app_version is not None:
+        where.append("app_version = ?")
+        params.append(app_version)
+    keys = "day, app_version" if by_version else "day"
+    sql = f"SELECT {keys}, {_SUMS} FROM review_daily_stats WHERE {' AND '.join(where)} GROUP BY {keys} ORDER BY {keys}"
+    return conn.execute(sql, params).fetchall()
+
+
+def _frame(rows: List[tuple], frequency: str, week_start: int, by_version: bool) -> "pd.DataFrame":
+    keys = ["period", "app_version"] if by_version else ["period"]
+    frame = pd.DataFrame.from_records(rows, columns=keys + list(SUM_COLUMNS))
+    frame["period"] = period_starts(pd.DatetimeIndex(pd.to_datetime(frame["period"])), frequency, week_start)
+    frame[list(SUM_COLUMNS)] = frame[list(SUM_COLUMNS)].fillna(0).astype(np.int64)
+    # the rows are in day order, so the periods come out sorted
+    return frame.groupby(keys, sort=by_version).sum()
+
+
+def _fill_gaps(frame: "pd.DataFrame", frequency: str) -> "pd.DataFrame":
+    """Add the periods without reviews between the first and the last one, with zero counts."""
+    if frame.empty:
+        return frame
+    step = {"daily": "D", "weekly": "7D", "monthly": "MS"}[frequency]
+    periods = pd.date_range(frame.index[0], frame.index[-1], freq=step, name="period")
+    return frame.reindex(periods, fill_value=0)
+
+
+def _derive(frame: "pd.DataFrame") -> "pd.DataFrame":
+    rated = frame["rating_count"].to_numpy(dtype=np.float64)
+    reviews = frame["reviews"].to_numpy(dtype=np.float64)
+    lengths = frame["text_length_sum"].to_numpy(dtype=np.float64)
+    squares = frame["text_length_sq_sum"].to_numpy(dtype=np.float64)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        frame["mean_rating"] = np.where(rated > 0, frame["rating_sum"] / rated, np.nan)
+        frame["low_share"] = np.where(rated > 0, (frame["score_1"] + frame["score_2"]) / rated, np.nan)
+        frame["high_share"] = np.where(rated > 0, frame["score_5"] / rated, np.nan)
+        mean_length = np.where(reviews > 0, lengths / reviews, np.nan)
+        frame["mean_text_length"] = mean_length
+        frame["text_length_std"] = np.sqrt(np.maximum(np.where(reviews > 0, squares / reviews, np.nan) - mean_length**2, 0))
+    return frame
+
+
+def rollup_frame(
+    db: Database,
+    package: Optional[str] = None,
+    frequency: str = "daily",
+    start: DateLike = None,
+    end: DateLike = None,
+    week_starts_on: Union[str, int, None] = None,
+    app_version: Optional[str] = None,
+    by_version: bool = False,
+) -> "pd.DataFrame":
+    """One row per period (and app version with ``by_version``), indexed by the period's first day.
+
+    Columns are ``SUM_COLUMNS`` plus ``mean_rating``, ``low_share`` (ratings
+    of 1-2), ``high_share`` (ratings of 5), ``mean_text_length`` and
+    ``text_length_std``. Periods without reviews between the first and the
+    last one are included with zero counts, unless ``by_version`` is set.
+    ``start``/``end`` bound the days (inclusive), so a week or month cut by
+    them only sums its days inside the range.
+    """
+    if pd is None:
+        raise RuntimeError("rollups need pandas; install it with `pip install pandas`")
+    if frequency not in FREQUENCIES:
+        raise ValueError(f"unsupported frequency: {frequency}")
+    conn = db if isinstance(db, sqlite3.Connection) else open_read_only(Path(db))
+    try:
+        rows = query_days(conn, package, start, end, app_version, by_version)
+    except sqlite3.OperationalError as exc:
+        if "review_daily_stats" not in str(exc):
+            raise
+        raise RuntimeError("the database has no daily rollup yet; run create_db.py or load reviews into it once") from exc
+    finally:
+        if conn is not db:
+            conn.close()
+    frame = _frame(rows, frequency, parse_week_start(week_starts_on), by_version)
+    if not by_version:
+        frame = _fill_gaps(frame, frequency)
+    return _derive(frame)
+
+
+def rollup_series(
+    db: Database,
+    metric: str,
+    package: Optional[str] = None,
+    frequency: str = "daily",
+    start: DateLike = None,
+    end: DateLike = None,
+    week_starts_on: Union[str, int, None] = None,
+    app_version: Optional[str] = None,
+) -> "pd.Series":
+    """One column of ``rollup_frame`` as a series; ``.to_numpy()`` gives the bare array."""
+    if metric not in SUM_COLUMNS + DERIVED_COLUMNS:
+        raise ValueError(f"unsupported metric: {metric}")
+    frame = rollup_frame(db, package, frequency, start, end, week_starts_on, app_version)
+    return frame[metric].rename(metric)
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Print review counts, ratings and text length per day, week or month")
+    parser.add_argument("--db", default="reviews.db", help="Review database (default: reviews.db)")
+    parser.add_argument("--app", default=None, help="Package name (default: all apps)")
+    parser.add_argument("--frequency", choices=FREQUENCIES, default="monthly")
+    parser.add_argument("--since", default=None, help="First day, YYYY-MM-DD")
+    parser.add_argument("--until", default=None, help="Last day, YYYY-MM-DD")
+    parser.add_argument("--week-starts-on", default=None, help="monday (default) ... sunday, or 0-6")
+    parser.add_argument("--app-version", default=None, help="Only reviews left on this app version")
+    parser.add_argument("--by-version", action="store_true", help="One row per period and app version")
+    return parser.parse_args()
+
+
+def main() -> None:
+    args = parse_args()
+    frame = rollup_frame(
+        args.db,
+        args.app,
+        args.frequency,
+        args.since,
+        args.until,
+        args.week_starts_on,
+        args.app_version,
+        args.by_version,
+    )
+    columns = ["reviews", "mean_rating", "low_share", "high_share", "mean_text_length", "text_length_std"]
+    print(frame[columns].to_string(float_format=lambda value: f"{value:.3f}"))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,142 +1,22 @@
-import csv
-import json
-import sys
+import argparse
 from datetime import date, datetime, timedelta
 from pathlib import Path
 from typing import Dict, Iterable, List, Optional, Tuple
 
-CURRENT_DIR = Path(__file__).resolve().parent
-ROOT_DIR = CURRENT_DIR.parent
-LIB_DIR = ROOT_DIR / "vendor"
-CONFIG_DIR = ROOT_DIR / "configs"
-if str(LIB_DIR) not in sys.path:
-    sys.path.insert(0, str(LIB_DIR))
-
-from gps import Sort, reviews  # noqa: E402
-from logging_utils import get_logger  # noqa: E402
+from checkpoints import CheckpointStore
+from fetch_planner import DensityPlanner
+from logging_utils import get_logger
+from parallel_export import PeriodExporter
+from pipeline import Pipeline, by_period, collected, ensure_subdir, load_config, replayed, within
+from request_governor import RequestGovernor
+from review_cache import ReviewCache, fetch_session, page_budget
+from scheduler import output_stem
+from scraper import CONFIG_DIR, ROOT_DIR, iter_backfill_pages, remember_density, run_config, run_single, stream_key
+from sinks import OutputSettings
 
 LOGGER = get_logger("chatgpt_review_pipeline")
 
 
-def load_config(path: Path) -> Dict:
-    with path.open("r", encoding="utf-8") as f:
-        return json.load(f)
-
-
-def ensure_output_dir(path: Path) -> None:
-    path.mkdir(parents=True, exist_ok=True)
-
-
-def ensure_subdir(base: Path, *parts: str) -> Path:
-    target = base.joinpath(*parts)
-    ensure_output_dir(target)
-    return target
-
-
-def fetch_reviews(
-    app_id: str,
-    lang: str,
-    country: str,
-    count: int,
-    max_pages: int = 1,
-    stop_at_date: Optional[date] = None,
-    progress_interval: Optional[int] = None,
-    progress_label: str = "",
-) -> List[Dict]:
-    data_list: List[Dict] = []
-    continuation_token: Optional[str] = None
-    pages = 0
-    total = 0
-
-    while True:
-        kwargs = {
-            "lang": lang,
-            "country": country,
-            "sort": Sort.NEWEST,
-            "count": count,
-        }
-        if continuation_token:
-            kwargs["continuation_token"] = continuation_token
-        result, continuation_token = reviews(app_id, **kwargs)
-
-        batch: List[Dict] = []
-        for data in result:
-            batch.append(
-                {
-                    "name": data.get("userName"),
-                    "content": data.get("content"),
-                    "score": data.get("score"),
-                    "at": data.get("at"),
-                    "appversion": data.get("appVersion"),
-                }
-            )
-        data_list.extend(batch)
-        pages += 1
-        total += len(batch)
-
-        if progress_interval and progress_interval > 0 and total // progress_interval != (total - len(batch)) // progress_interval:
-            label = f"[{progress_label}] " if progress_label else ""
-            LOGGER.info("%s Got %d comments", label, total)
-
-        if not continuation_token:
-            break
-        if pages >= max_pages:
-            break
-        if stop_at_date:
-            oldest = _oldest_date(batch)
-            if oldest and oldest <= stop_at_date:
-                break
-
-    return data_list
-
-
-def _oldest_date(rows: List[Dict]) -> Optional[date]:
-    oldest: Optional[date] = None
-    for row in rows:
-        comment_at = row.get("at")
-        if not comment_at:
-            continue
-        comment_date = comment_at.date() if hasattr(comment_at, "date") else comment_at
-        if isinstance(comment_date, datetime):
-            comment_date = comment_date.date()
-        if not isinstance(comment_date, date):
-            continue
-        if oldest is None or comment_date < oldest:
-            oldest = comment_date
-    return oldest
-
-
-def filter_rows_by_period(
-    rows: List[Dict],
-    period_start: date,
-    period_end: date,
-) -> List[Dict]:
-    filtered: List[Dict] = []
-    for row in rows:
-        comment_at = row.get("at")
-        if not comment_at:
-            continue
-        comment_date = comment_at.date() if hasattr(comment_at, "date") else comment_at
-        if period_start <= comment_date <= period_end:
-            filtered.append(row)
-    return filtered
-
-
-def save_to_csv(rows: List[Dict], output_path: Path) -> None:
-    with output_path.open("w", encoding="utf-8-sig", newline="") as f:
-        if rows:
-            writer = csv.DictWriter(f, fieldnames=list(rows[0].keys()))
-            writer.writeheader()
-            writer.writerows(rows)
-        else:
-            writer = csv.writer(f)
-            writer.writerow(["empty"])
-    if rows:
-        LOGGER.info("created %s", output_path)
-    else:
-        LOGGER.warning("%s No reviews found; an empty file was created", output_path)
-
-
 def parse_date(value: str) -> date:
     return datetime.strptime(value, "%Y-%m-%d").date()
 
@@ -170,26 +50,17 @@ def iter_periods(freq: str, start: date, end: date) -> Iterable[Tuple[date, date
     return periods
 
 
-def run_single(app_cfg: Dict, base_output: Path, lang: str, country: str) -> None:
-    count = int(app_cfg.get("count", 1000))
-    max_pages = int(app_cfg.get("max_pages", 1))
-    progress_interval = int(app_cfg.get("progress_interval", 0))
-    package = app_cfg["package"]
-    rows = fetch_reviews(
-        package,
-        lang,
-        country,
-        count,
-        max_pages=max_pages,
-        progress_interval=progress_interval,
-        progress_label=f"{package}-single",
-    )
-    single_dir = ensure_subdir(base_output, "single")
-    output_file = single_dir / f"{package}_single.csv"
-    save_to_csv(rows, output_file)
-
-
-def run_schedule(app_cfg: Dict, base_output: Path, lang: str, country: str) -> None:
+def run_schedule(
+    app_cfg: Dict,
+    base_output: Path,
+    lang: str,
+    country: str,
+    checkpoints: Optional[CheckpointStore] = None,
+    resume: bool = False,
+    cache: Optional[ReviewCache] = None,
+    outputs: OutputSettings = OutputSettings(),
+    governor: Optional[RequestGovernor] = None,
+) -> None:
     base_count = int(app_cfg.get("count", 1000))
     max_pages_cfg = app_cfg.get("max_pages")
     max_pages = int(max_pages_cfg) if max_pages_cfg is not None else None
@@ -210,123 +81,80 @@ def run_schedule(app_cfg: Dict, base_output: Path, lang: str, country: str) -> N
         return
 
     earliest_start = periods[0][0]
-    rows = collect_reviews_for_periods(
-        package=package,
-        lang=lang,
-        country=country,
-        count=base_count,
-        stop_at=earliest_start,
-        max_pages=max_pages,
-        auto_start=auto_pages_start,
-        auto_multiplier=auto_pages_multiplier,
-        auto_cap=auto_pages_cap,
-        auto_count_start=auto_count_start,
-        auto_count_multiplier=auto_count_multiplier,
-        auto_count_cap=auto_count_cap,
-        progress_interval=progress_interval,
-        progress_label=f"{package}-{earliest_start:%Y%m%d}-{periods[-1][1]:%Y%m%d}",
-    )
-
+    stem = output_stem(app_cfg, lang, country)
+    label = f"{stem}-{earliest_start:%Y%m%d}-{periods[-1][1]:%Y%m%d}"
     schedule_dir = ensure_subdir(base_output, "schedule", frequency)
-    for period_start, period_end in periods:
-        period_rows = filter_rows_by_period(rows, period_start, period_end)
-        suffix = f"{period_start:%Y%m%d}-{period_end:%Y%m%d}"
-        output_file = schedule_dir / f"{package}_{frequency}_{suffix}.csv"
-        save_to_csv(period_rows, output_file)
-
-
-def collect_reviews_for_periods(
-    package: str,
-    lang: str,
-    country: str,
-    count: int,
-    stop_at: date,
-    max_pages: Optional[int],
-    auto_start: int,
-    auto_multiplier: float,
-    auto_cap: int,
-    auto_count_start: int,
-    auto_count_multiplier: float,
-    auto_count_cap: int,
-    progress_interval: int,
-    progress_label: str,
-) -> List[Dict]:
-
-    if max_pages is not None:
-        return fetch_reviews(
-            package,
-            lang,
-            country,
-            count,
-            max_pages=max_pages,
-            stop_at_date=stop_at,
-            progress_interval=progress_interval,
-            progress_label=progress_label,
-        )
-
-    pages = max(1, auto_start)
-    multiplier = auto_multiplier if auto_multiplier > 1 else 2.0
-    cap = max(pages, auto_cap)
-    count_current = max(1, auto_count_start, count)
-    count_mul = auto_count_multiplier if auto_count_multiplier > 1 else 2.0
-    count_cap = max(count_current, auto_count_cap)
-
-    rows: List[Dict] = []
-    while True:
-        LOGGER.info("Attempting to fetch up to %d pages, %d reviews per page, covering %s.", pages, count_current, stop_at)
-        rows = fetch_reviews(
-            package,
-            lang,
-            country,
-            count_current,
-            max_pages=pages,
-            stop_at_date=stop_at,
+    planner = None
+    if app_cfg.get("auto_plan", True):
+        prior_rate = checkpoints.density(package, lang, country) if checkpoints is not None else None
+        planner = DensityPlanner(auto_count_start, auto_count_cap, prior_rate, margin=float(app_cfg.get("auto_plan_margin", 1.2)))
+    dataset = outputs.parquet_dataset(base_output, package, frequency, lang, country)
+    stream = bool(app_cfg.get("stream_output"))
+
+    def period_path(period: Tuple[date, date]) -> Path:
+        return schedule_dir / f"{stem}_{frequency}_{period[0]:%Y%m%d}-{period[1]:%Y%m%d}.csv"
+
+    # streamed rows go straight to their sinks, so there is nothing to share through the cache
+    with fetch_session(stream_key(package, lang, country), base_count, label, checkpoints, None if stream else cache, resume) as (
+        state,
+        on_page,
+    ):
+        pages = iter_backfill_pages(
+            package=package,
+            lang=lang,
+            country=country,
+            count=base_count,
+            stop_at=earliest_start,
+            max_pages=page_budget(state, base_count, max_pages) if max_pages is not None else None,
+            auto_start=auto_pages_start,
+            auto_multiplier=auto_pages_multiplier,
+            auto_cap=auto_pages_cap,
+            auto_count_start=auto_count_start,
+            auto_count_multiplier=auto_count_multiplier,
+            auto_count_cap=auto_count_cap,
             progress_interval=progress_interval,
-            progress_label=f"{progress_label}-p{pages}",
+            progress_label=label,
+            state=state,
+            on_page=on_page,
+            keep_rows=not stream,
+            governor=governor,
+            planner=planner,
         )
-        oldest = _oldest_date(rows)
-        if not oldest:
-            LOGGER.warning("Attempting to fetch up to %d pages with %d reviews per page")
-            return rows
-        if oldest <= stop_at:
-            return rows
-        if count_current < count_cap:
-            new_count = min(count_cap, int(max(count_current * count_mul, count_current + 1)))
-            if new_count > count_current:
-                LOGGER.info("Earliest review %s is later than target date %s; increasing per-request count to %d.", oldest, stop_at, new_count)
-                count_current = new_count
-                continue
-        new_pages = min(cap, int(max(pages * multiplier, pages + 1)))
-        if new_pages == pages:
-            LOGGER.warning(
-                "Even after auto-pagination up to the limit of %d pages, the target date %s was not reached (earliest review only goes back to %s)",
-                pages,
-                stop_at,
-                oldest,
-            )
-            return rows
-        pages = new_pages
-        LOGGER.info("Earliest review %s is later than target date %s; expanding the number of pages to %d", oldest, stop_at, pages)
+        if stream:
+            # a resumed checkpoint is replayed first, the files are rewritten from scratch
+            sink = outputs.job_sink(package, period_path, dataset, periods, max_open_files=int(app_cfg.get("max_open_files", 32)))
+            Pipeline(replayed(state, pages), sink, [within(earliest_start, periods[-1][1])]).run()
+        else:
+            # whole periods are known up front, so their files can be written on several cores
+            exporter = None
+            if outputs.export_workers > 1:
+                summary_path = ensure_subdir(base_output, "summary", frequency) / f"{stem}_{frequency}_{earliest_start:%Y%m%d}-{periods[-1][1]:%Y%m%d}.csv"
+                exporter = PeriodExporter(outputs.export_workers, summary_path=summary_path)
+            sink = outputs.job_sink(package, period_path, dataset, exporter=exporter)
+            Pipeline(collected(state, pages), sink, bucket=by_period(periods)).run()
+        remember_density(checkpoints, package, lang, country, state)
 
 
-def run(config_path: Optional[str] = None) -> None:
+def run(config_path: Optional[str] = None, resume: bool = False) -> None:
     cfg_file = Path(config_path) if config_path else CONFIG_DIR / "default.json"
-    config = load_config(cfg_file)
-    lang = config.get("lang", "en")
-    country = config.get("country", "us")
-    output_dir = ROOT_DIR / config.get("output_dir", "output")
-    ensure_output_dir(output_dir)
+    run_config(load_config(cfg_file), ROOT_DIR, "single", {"single": run_single, "schedule": run_schedule}, resume)
 
-    for app_cfg in config.get("apps", []):
-        mode = app_cfg.get("mode", "single")
-        if mode == "single":
-            run_single(app_cfg, output_dir, lang, country)
-        elif mode == "schedule":
-            run_schedule(app_cfg, output_dir, lang, country)
-        else:
-            LOGGER.warning("Unknown mode %s; skipping %s", mode, app_cfg.get("package"))
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Fetch Google Play reviews for the apps listed in a configuration file")
+    parser.add_argument(
+        "config",
+        nargs="?",
+        help="Path to the configuration file (default: ../configs/default.json)",
+    )
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="Continue each fetch from its last saved checkpoint instead of the first page.",
+    )
+    return parser.parse_args()
 
 
 if __name__ == "__main__":
-    cfg_path = sys.argv[1] if len(sys.argv) > 1 else None
-    run(cfg_path)
+    args = parse_args()
+    run(args.config, resume=args.resume)
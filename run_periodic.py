@@ -1,144 +1,25 @@
 import argparse
-import csv
-import json
-import sys
+import asyncio
+import time
 from datetime import date, datetime, timedelta
+from functools import partial
 from pathlib import Path
-from typing import Dict, List, Optional, Tuple
-
-CURRENT_DIR = Path(__file__).resolve().parent
-ROOT_DIR = CURRENT_DIR.parent
-LIB_DIR = ROOT_DIR / "vendor"
-CONFIG_DIR = ROOT_DIR / "configs"
-
-if str(LIB_DIR) not in sys.path:
-    sys.path.insert(0, str(LIB_DIR))
-
-from gps import Sort, reviews  # noqa: E402
-from logging_utils import get_logger  # noqa: E402
+from typing import Callable, Dict, List, Optional, Tuple
+
+from checkpoints import CheckpointKey, CheckpointStore, FetchState, Watermark, advance_watermark
+from logging_utils import get_logger
+from metrics import METRICS, report_run
+from pipeline import Pipeline, by_period, collected, ensure_output_dir, ensure_subdir, filter_rows_by_period, load_config, parse_week_start, within
+from records import Review
+from request_governor import RequestGovernor
+from review_cache import ReviewCache, fetch_session, page_budget
+from scheduler import Job, expand_jobs, output_stem
+from scraper import CONFIG_DIR, ROOT_DIR, iter_pages_since, iter_review_pages, play_governor, run_config, run_single, stream_key
+from sinks import OutputSettings, output_settings, period_label
 
 LOGGER = get_logger(__name__)
 
 
-def load_config(path: Path) -> Dict:
-    with path.open("r", encoding="utf-8") as f:
-        return json.load(f)
-
-
-def ensure_output_dir(path: Path) -> None:
-    path.mkdir(parents=True, exist_ok=True)
-
-
-def ensure_subdir(base: Path, *parts: str) -> Path:
-    target = base.joinpath(*parts)
-    ensure_output_dir(target)
-    return target
-
-
-def fetch_reviews(
-    app_id: str,
-    lang: str,
-    country: str,
-    count: int,
-    max_pages: int = 1,
-    stop_at_date: Optional[date] = None,
-    progress_interval: Optional[int] = None,
-    progress_label: str = "",
-) -> List[Dict]:
-    data_list: List[Dict] = []
-    continuation_token: Optional[str] = None
-    pages = 0
-    total = 0
-
-    while True:
-        kwargs = {
-            "lang": lang,
-            "country": country,
-            "sort": Sort.NEWEST,
-            "count": count,
-        }
-        if continuation_token:
-            kwargs["continuation_token"] = continuation_token
-        result, continuation_token = reviews(app_id, **kwargs)
-
-        batch: List[Dict] = []
-        for data in result:
-            batch.append(
-                {
-                    "name": data.get("userName"),
-                    "content": data.get("content"),
-                    "score": data.get("score"),
-                    "at": data.get("at"),
-                    "appversion": data.get("appVersion"),
-                }
-            )
-        data_list.extend(batch)
-        pages += 1
-        total += len(batch)
-
-        if progress_interval and progress_interval > 0 and total // progress_interval != (total - len(batch)) // progress_interval:
-            label = f"[{progress_label}] " if progress_label else ""
-            LOGGER.info("%s has fetched %d reviews", label, total)
-
-        if not continuation_token:
-            break
-        if pages >= max_pages:
-            break
-        if stop_at_date:
-            oldest = _oldest_date(batch)
-            if oldest and oldest <= stop_at_date:
-                break
-
-    return data_list
-
-
-def _oldest_date(rows: List[Dict]) -> Optional[date]:
-    oldest: Optional[date] = None
-    for row in rows:
-        comment_at = row.get("at")
-        if not comment_at:
-            continue
-        comment_date = comment_at.date() if hasattr(comment_at, "date") else comment_at
-        if isinstance(comment_date, datetime):
-            comment_date = comment_date.date()
-        if not isinstance(comment_date, date):
-            continue
-        if oldest is None or comment_date < oldest:
-            oldest = comment_date
-    return oldest
-
-
-def filter_rows_by_period(
-    rows: List[Dict],
-    period_start: date,
-    period_end: date,
-) -> List[Dict]:
-    filtered: List[Dict] = []
-    for row in rows:
-        comment_at = row.get("at")
-        if not comment_at:
-            continue
-        comment_date = comment_at.date() if hasattr(comment_at, "date") else comment_at
-        if period_start <= comment_date <= period_end:
-            filtered.append(row)
-    return filtered
-
-
-def save_to_csv(rows: List[Dict], output_path: Path) -> None:
-    with output_path.open("w", encoding="utf-8-sig", newline="") as f:
-        if rows:
-            writer = csv.DictWriter(f, fieldnames=list(rows[0].keys()))
-            writer.writeheader()
-            writer.writerows(rows)
-        else:
-            writer = csv.writer(f)
-            writer.writerow(["empty"])
-    if rows:
-        LOGGER.info("created %s", output_path)
-    else:
-        LOGGER.warning("%s did not retrieve any review data; an empty file has been generated.", output_path)
-
-
 def current_period(freq: str, ref: date, week_start: int = 0) -> Tuple[date, date]:
     if freq == "daily":
         return ref, ref
@@ -158,25 +39,20 @@ def current_period(freq: str, ref: date, week_start: int = 0) -> Tuple[date, dat
     raise ValueError(f"unsupported frequency: {freq}")
 
 
-def parse_week_start(value: Optional[str]) -> int:
-    if value is None:
-        return 0
-    value_str = str(value).strip()
-    if value_str.isdigit():
-        num = int(value_str)
-        if 0 <= num <= 6:
-            return num
-        return 0
-    mapping = {
-        "monday": 0,
-        "tuesday": 1,
-        "wednesday": 2,
-        "thursday": 3,
-        "friday": 4,
-        "saturday": 5,
-        "sunday": 6,
-    }
-    return mapping.get(value_str.lower(), 0)
+def job_period(app_cfg: Dict, ref_date: date) -> Tuple[date, date]:
+    """The window a periodic entry covers on ``ref_date``, after ``ref_offset_days``."""
+    frequency = app_cfg.get("frequency", "daily")
+    ref_offset = int(app_cfg.get("ref_offset_days", 0))
+    week_start = parse_week_start(app_cfg.get("week_starts_on"))
+    return current_period(frequency, ref_date + timedelta(days=ref_offset), week_start=week_start)
+
+
+def periodic_path(base_output: Path, stem: str, frequency: str) -> Callable[[Tuple[date, date]], Path]:
+    def period_path(period: Tuple[date, date]) -> Path:
+        periodic_dir = ensure_subdir(base_output, "periodic", frequency)
+        return periodic_dir / f"{stem}_{frequency}_{period[0]:%Y%m%d}-{period[1]:%Y%m%d}.csv"
+
+    return period_path
 
 
 def run_periodic_app(
@@ -185,63 +61,257 @@ def run_periodic_app(
     lang: str,
     country: str,
     ref_date: date,
+    checkpoints: Optional[CheckpointStore] = None,
+    resume: bool = False,
+    cache: Optional[ReviewCache] = None,
+    outputs: OutputSettings = OutputSettings(),
+    governor: Optional[RequestGovernor] = None,
 ) -> None:
     frequency = app_cfg.get("frequency", "daily")
-    ref_offset = int(app_cfg.get("ref_offset_days", 0))
-    week_start = parse_week_start(app_cfg.get("week_starts_on"))
-    ref_for_period = ref_date + timedelta(days=ref_offset)
-    period_start, period_end = current_period(frequency, ref_for_period, week_start=week_start)
+    period_start, period_end = job_period(app_cfg, ref_date)
     count = int(app_cfg.get("count", 100))
     max_pages = int(app_cfg.get("max_pages", 10))
     progress_interval = int(app_cfg.get("progress_interval", 0))
     package = app_cfg["package"]
-    rows = fetch_reviews(
-        package,
-        lang,
-        country,
-        count,
-        max_pages=max_pages,
-        stop_at_date=period_start,
-        progress_interval=progress_interval,
-        progress_label=f"{package}-{frequency}",
-    )
-    rows = filter_rows_by_period(rows, period_start, period_end)
-    suffix = f"{period_start:%Y%m%d}-{period_end:%Y%m%d}"
-    periodic_dir = ensure_subdir(base_output, "periodic", frequency)
-    output_file = periodic_dir / f"{package}_{frequency}_{suffix}.csv"
-    save_to_csv(rows, output_file)
+    stem = output_stem(app_cfg, lang, country)
+    period_path = periodic_path(base_output, stem, frequency)
+    dataset = outputs.parquet_dataset(base_output, package, frequency, lang, country)
+    delta_sync = bool(app_cfg.get("delta_sync", False)) and checkpoints is not None
+    mark = checkpoints.watermark(package, lang, country, frequency) if delta_sync else None
+    if mark is not None and mark.at.date() >= period_start and not _period_written(outputs, period_path, dataset, (period_start, period_end)):
+        LOGGER.warning("[%s-%s] the period file is gone; fetching the whole period again", stem, frequency)
+        mark = None
+
+    with fetch_session(stream_key(package, lang, country), count, f"{stem}-{frequency}", checkpoints, cache, resume) as (state, on_page):
+        pages = iter_review_pages(
+            package,
+            lang,
+            country,
+            count,
+            max_pages=page_budget(state, count, max_pages),
+            stop_at_date=period_start,
+            progress_interval=progress_interval,
+            progress_label=f"{stem}-{frequency}",
+            state=state,
+            on_page=on_page,
+            governor=governor,
+        )
+        transforms = []
+        if mark is not None:
+            if any(not mark.is_new(row) for row in state.rows):
+                # the cached pages already reach the watermark
+                pages = iter(())
+            pages = iter_pages_since(pages, mark)
+            transforms.append(lambda rows: [row for row in rows if mark.is_new(row)])
+        written: List[Review] = []
+        if delta_sync:
+            # the watermark only moves over reviews that made it into the period
+            transforms.append(lambda rows: _remember(written, filter_rows_by_period(rows, period_start, period_end)))
+        sink = outputs.job_sink(package, period_path, dataset, merge=mark is not None)
+        Pipeline(collected(state, pages), sink, transforms, by_period([(period_start, period_end)])).run()
+        if mark is not None:
+            LOGGER.info("[%s-%s] %d reviews newer than %s", stem, frequency, len(written), mark.at)
+        if delta_sync:
+            new_mark = advance_watermark(mark, written)
+            if new_mark is not None:
+                checkpoints.save_watermark(package, lang, country, frequency, new_mark)
+
+
+def _remember(target: List[Review], rows: List[Review]) -> List[Review]:
+    target.extend(rows)
+    return rows
+
+
+def _period_written(outputs: OutputSettings, period_path: Callable, dataset, period: Tuple[date, date]) -> bool:
+    """Whether every file output of the period exists, so a delta can be merged into it."""
+    if outputs.write_csv and not period_path(period).exists():
+        return False
+    if dataset is not None and not dataset.partition_dir(period_label(period)).exists():
+        return False
+    return True
+
+
+def run(config_path: Optional[str], ref_date: date, resume: bool = False) -> None:
+    cfg_file = Path(config_path) if config_path else CONFIG_DIR / "periodic.json"
+    handlers = {"periodic": partial(run_periodic_app, ref_date=ref_date), "single": partial(run_single, default_count=100)}
+    run_config(load_config(cfg_file), ROOT_DIR, "periodic", handlers, resume)
+
+
+JobId = Tuple[str, str, str, str]
+
+
+def _job_id(job: Job) -> JobId:
+    return (job.package, job.lang, job.country, job.app_cfg.get("frequency", "daily"))
+
+
+class StreamWindow:
+    """Rows of one review stream held between ticks, newest first, back to ``start``."""
+
+    def __init__(self) -> None:
+        self.rows: List[Review] = []
+        self.start: Optional[date] = None
+        self.mark: Optional[Watermark] = None
+
+
+class PeriodicDaemon:
+    """Resident runner for the periodic entries of a config.
+
+    Instead of a cold start per cron tick it keeps the parsed config (reread
+    when the file changes), the request governor and, per review stream,
+    the rows of the windows its jobs cover plus a watermark of the newest
+    review. A tick only downloads the pages above that watermark, merges
+    them into the window and rewrites the current period of every due job.
+    When a period rolls over, the finished one is written once more with the
+    reviews that arrived since the previous tick.
+
+    Each entry runs every ``poll_minutes`` (per app, or top level; default
+    60). Streams are refreshed concurrently on up to ``workers`` threads.
+    """
+
+    def __init__(self, config_path: Path, root: Path, today: Callable[[], date] = date.today) -> None:
+        self.config_path = config_path
+        self.root = root
+        self.today = today
+        self.config: Dict = {}
+        self.jobs: List[Job] = []
+        self.streams: Dict[CheckpointKey, StreamWindow] = {}
+        self.written: Dict[JobId, Tuple[date, date]] = {}
+        self.next_run: Dict[JobId, float] = {}
+        self._mtime: Optional[float] = None
+
+    def reload(self) -> None:
+        mtime = self.config_path.stat().st_mtime
+        if mtime == self._mtime:
+            return
+        if self._mtime is not None:
+            LOGGER.info("%s changed; reloading", self.config_path)
+        self.config = load_config(self.config_path)
+        self._mtime = mtime
+        self.output_dir = self.root / self.config.get("output_dir", "output")
+        ensure_output_dir(self.output_dir)
+        self.outputs = output_settings(self.config, self.root)
+        self.governor = play_governor(self.config)
+        jobs = expand_jobs(self.config, "periodic")
+        skipped = [job for job in jobs if job.mode != "periodic"]
+        for job in skipped:
+            LOGGER.warning("Mode %s is not run by the daemon; skipping %s", job.mode, job.package)
+        self.jobs = [job for job in jobs if job.mode == "periodic"]
+        ids = {_job_id(job) for job in self.jobs}
+        self.next_run = {job_id: due for job_id, due in self.next_run.items() if job_id in ids}
+
+    def poll_seconds(self, job: Job) -> float:
+        return 60 * float(job.app_cfg.get("poll_minutes", self.config.get("poll_minutes", 60)))
+
+    def due(self, now: float) -> List[Job]:
+        return [job for job in self.jobs if self.next_run.get(_job_id(job), 0.0) <= now]
+
+    async def serve(self, ticks: Optional[int] = None) -> None:
+        """Run due jobs until cancelled, or for ``ticks`` rounds."""
+        done = 0
+        while ticks is None or done < ticks:
+            self.reload()
+            due = self.due(time.monotonic())
+            if due:
+                await self.tick(due)
+                done += 1
+                finished = time.monotonic()
+                for job in due:
+                    self.next_run[_job_id(job)] = finished + self.poll_seconds(job)
+            if not self.jobs:
+                LOGGER.warning("No periodic entries in %s", self.config_path)
+            wait = min(self.next_run.values(), default=time.monotonic() + 60) - time.monotonic()
+            # wake at least once a minute to notice config changes
+            await asyncio.sleep(min(60.0, max(0.0, wait)))
+
+    async def tick(self, jobs: List[Job]) -> None:
+        streams: Dict[CheckpointKey, List[Job]] = {}
+        for job in jobs:
+            streams.setdefault(stream_key(job.package, job.lang, job.country), []).append(job)
+        ref_date = self.today()
+        limit = asyncio.Semaphore(max(1, int(self.config.get("workers", 1))))
+
+        async def refresh(key: CheckpointKey, stream_jobs: List[Job]) -> None:
+            async with limit:
+                await asyncio.to_thread(self.refresh, key, stream_jobs, ref_date)
+
+        METRICS.reset()
+        results = await asyncio.gather(*(refresh(key, stream_jobs) for key, stream_jobs in streams.items()), return_exceptions=True)
+        failures = 0
+        for (key, _), result in zip(streams.items(), results):
+            if isinstance(result, Exception):
+                failures += 1
+                LOGGER.error("[%s] tick failed", "-".join(map(str, key[:3])), exc_info=result)
+        metrics_textfile = self.config.get("metrics_textfile")
+        report_run(not failures, self.root / metrics_textfile if metrics_textfile else None)
+
+    def refresh(self, key: CheckpointKey, jobs: List[Job], ref_date: date) -> None:
+        """Fetch the reviews of ``key`` above its watermark and rewrite the periods of ``jobs``."""
+        package, lang, country, _ = key
+        periods: Dict[JobId, List[Tuple[date, date]]] = {}
+        for job in jobs:
+            current = job_period(job.app_cfg, ref_date)
+            previous = self.written.get(_job_id(job))
+            periods[_job_id(job)] = [previous, current] if previous is not None and previous != current else [current]
+        window_start = min(period[0] for job_periods in periods.values() for period in job_periods)
+        window_end = max(period[1] for job_periods in periods.values() for period in job_periods)
+        count = max(int(job.app_cfg.get("count", 100)) for job in jobs)
+        max_pages = max(int(job.app_cfg.get("max_pages", 10)) for job in jobs)
+        label = f"{output_stem(jobs[0].app_cfg, lang, country)}-daemon"
+
+        window = self.streams.setdefault(key, StreamWindow())
+        # a window that starts later than needed was never fetched that far back
+        mark = window.mark if window.start is not None and window.start <= window_start else None
+        state = FetchState()
+        pages = iter_review_pages(
+            package,
+            lang,
+            country,
+            count,
+            max_pages=max_pages,
+            stop_at_date=window_start,
+            progress_interval=int(jobs[0].app_cfg.get("progress_interval", 0)),
+            progress_label=label,
+            state=state,
+            keep_rows=False,
+            governor=self.governor,
+        )
+        delta = [row for page in iter_pages_since(pages, mark) for row in page]
+        reached_mark = state.total > len(delta)
+        if mark is not None and not reached_mark and not state.exhausted and (state.oldest is None or state.oldest > window_start):
+            LOGGER.warning("[%s] more than %d pages of new reviews since the last tick; fetching the window again", label, max_pages)
+            window.start = None
+            self.refresh(key, jobs, ref_date)
+            return
+        held = window.rows if mark is not None else []
+        window.rows = delta + [row for row in held if row.day is not None and row.day >= window_start]
+        window.start = window_start
+        window.mark = advance_watermark(mark, delta)
+        LOGGER.info("[%s] %d new reviews in %d pages; holding %d since %s", label, len(delta), state.pages, len(window.rows), window_start)
+
+        for job in jobs:
+            frequency = job.app_cfg.get("frequency", "daily")
+            stem = output_stem(job.app_cfg, lang, country)
+            sink = self.outputs.job_sink(
+                package,
+                periodic_path(self.output_dir, stem, frequency),
+                self.outputs.parquet_dataset(self.output_dir, package, frequency, lang, country),
+                include_database=False,
+            )
+            Pipeline([window.rows], sink, bucket=by_period(periods[_job_id(job)])).run()
+            self.written[_job_id(job)] = periods[_job_id(job)][-1]
+        database = self.outputs.database_sink(package) if delta else None
+        if database is not None:
+            # only the new rows; everything older was inserted by an earlier tick
+            Pipeline([delta], database, [within(window_start, window_end)]).run()
 
 
-def run(config_path: Optional[str], ref_date: date) -> None:
+def serve(config_path: Optional[str], ticks: Optional[int] = None) -> None:
     cfg_file = Path(config_path) if config_path else CONFIG_DIR / "periodic.json"
-    config = load_config(cfg_file)
-    lang = config.get("lang", "en")
-    country = config.get("country", "us")
-    output_dir = ROOT_DIR / config.get("output_dir", "output")
-    ensure_output_dir(output_dir)
-
-    for app_cfg in config.get("apps", []):
-        mode = app_cfg.get("mode", "periodic")
-        if mode == "periodic":
-            run_periodic_app(app_cfg, output_dir, lang, country, ref_date)
-        elif mode == "single":
-            count = int(app_cfg.get("count", 100))
-            max_pages = int(app_cfg.get("max_pages", 1))
-            progress_interval = int(app_cfg.get("progress_interval", 0))
-            rows = fetch_reviews(
-                app_cfg["package"],
-                lang,
-                country,
-                count,
-                max_pages=max_pages,
-                progress_interval=progress_interval,
-                progress_label=f"{app_cfg['package']}-single",
-            )
-            single_dir = ensure_subdir(output_dir, "single")
-            output_file = single_dir / f"{app_cfg['package']}_single.csv"
-            save_to_csv(rows, output_file)
-        else:
-            LOGGER.warning("Unknown mode %s; skipping %s.", mode, app_cfg.get("package"))
+    daemon = PeriodicDaemon(cfg_file, ROOT_DIR)
+    try:
+        asyncio.run(daemon.serve(ticks))
+    except KeyboardInterrupt:
+        LOGGER.info("Daemon stopped")
 
 
 def parse_args() -> argparse.Namespace:
@@ -255,12 +325,25 @@ def parse_args() -> argparse.Namespace:
         "--date",
         help="Specify the reference date (YYYY-MM-DD). Defaults to today; useful for backfilling or testing.",
     )
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="Continue each fetch from its last saved checkpoint instead of the first page.",
+    )
+    parser.add_argument(
+        "--daemon",
+        action="store_true",
+        help="Stay resident and run the periodic entries every poll_minutes, fetching only new reviews each time.",
+    )
     return parser.parse_args()
 
 
 if __name__ == "__main__":
     args = parse_args()
-    ref = date.today()
-    if args.date:
-        ref = datetime.strptime(args.date, "%Y-%m-%d").date()
-    run(args.config, ref)
+    if args.daemon:
+        serve(args.config)
+    else:
+        ref = date.today()
+        if args.date:
+            ref = datetime.strptime(args.date, "%Y-%m-%d").date()
+        run(args.config, ref, resume=args.resume)
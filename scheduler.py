@@ -0,0 +1,88 @@
+"""Fan config jobs out across a bounded worker pool."""
+from __future__ import annotations
+
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Callable, Dict, List, NamedTuple, Union
+
+from logging_utils import get_logger
+
+LOGGER = get_logger("googleplay.scheduler")
+
+
+class Job(NamedTuple):
+    app_cfg: Dict
+    mode: str
+    lang: str
+    country: str
+
+    @property
+    def package(self) -> str:
+        return self.app_cfg["package"]
+
+    @property
+    def label(self) -> str:
+        return f"{self.package}-{self.mode}-{self.lang}-{self.country}"
+
+
+def _as_list(value: Union[str, List[str]]) -> List[str]:
+    if isinstance(value, (list, tuple)):
+        return [str(item) for item in value]
+    return [str(value)]
+
+
+def expand_jobs(config: Dict, default_mode: str) -> List[Job]:
+    """One job per app entry and locale; apps may override ``lang``/``country`` with a value or a list."""
+    default_lang = config.get("lang", "en")
+    default_country = config.get("country", "us")
+    jobs: List[Job] = []
+    for app_cfg in config.get("apps", []):
+        mode = app_cfg.get("mode", default_mode)
+        for lang in _as_list(app_cfg.get("lang", default_lang)):
+            for country in _as_list(app_cfg.get("country", default_country)):
+                jobs.append(Job(app_cfg, mode, lang, country))
+    return jobs
+
+
+def output_stem(app_cfg: Dict, lang: str, country: str) -> str:
+    """File name prefix for a job; apps with their own locale list get it in the name."""
+    package = app_cfg["package"]
+    if "lang" in app_cfg or "country" in app_cfg:
+        return f"{package}_{lang}-{country}"
+    return package
+
+
+def _run_chain(chain: List[Job], handler: Callable[[Job], None]) -> int:
+    failures = 0
+    for job in chain:
+        started = time.monotonic()
+        LOGGER.info("[%s] started", job.label)
+        try:
+            handler(job)
+        except Exception:
+            failures += 1
+            LOGGER.exception("[%s] failed after %.1fs", job.label, time.monotonic() - started)
+            continue
+        LOGGER.info("[%s] finished in %.1fs", job.label, time.monotonic() - started)
+    return failures
+
+
+def run_jobs(jobs: List[Job], handler: Callable[[Job], None], workers: int = 1) -> None:
+    """Run ``handler`` for every job on up to ``workers`` threads.
+
+    Jobs reading the same review stream (package, lang, country) share one
+    chain and run in config order, so they never race on its checkpoint.
+    """
+    chains: Dict[tuple, List[Job]] = {}
+    for job in jobs:
+        chains.setdefault((job.package, job.lang, job.country), []).append(job)
+
+    workers = max(1, min(int(workers), len(chains) or 1))
+    LOGGER.info("Running %d jobs in %d streams with %d workers", len(jobs), len(chains), workers)
+    failures = 0
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="scrape") as pool:
+        futures = [pool.submit(_run_chain, chain, handler) for chain in chains.values()]
+        for future in as_completed(futures):
+            failures += future.result()
+    if failures:
+        raise RuntimeError(f"{failures} of {len(jobs)} jobs failed; see the log for details")
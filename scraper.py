@@ -0,0 +1,402 @@
+"""Google Play side of the pipeline: the vendored client, review page sources and the config run loop.
+
+``run_from_config.py`` and ``run_periodic.py`` plug their modes into
+``run_config``; each mode wires a source from here into ``pipeline.Pipeline``.
+"""
+from __future__ import annotations
+
+import sys
+import time
+from datetime import date
+from pathlib import Path
+from typing import Callable, Dict, Iterable, Iterator, List, Optional
+
+CURRENT_DIR = Path(__file__).resolve().parent
+ROOT_DIR = CURRENT_DIR.parent
+LIB_DIR = ROOT_DIR / "vendor"
+CONFIG_DIR = ROOT_DIR / "configs"
+
+# the scraper library is vendored next to the project rather than installed
+if str(LIB_DIR) not in sys.path:
+    sys.path.insert(0, str(LIB_DIR))
+
+from gps import Sort, reviews  # noqa: E402
+from gps.exceptions import GooglePlayScraperException, NotFoundError  # noqa: E402
+from checkpoints import CheckpointKey, CheckpointStore, FetchState, Watermark, has_more, review_key  # noqa: E402
+from fetch_planner import DensityPlanner  # noqa: E402
+from logging_utils import get_logger  # noqa: E402
+from metrics import METRICS, report_run  # noqa: E402
+from pipeline import Pipeline, as_one, collected, ensure_output_dir, ensure_subdir  # noqa: E402
+from records import Review, review_from_gps  # noqa: E402
+from request_governor import RequestGovernor, governor_from_config  # noqa: E402
+from review_cache import PageCallback, ReviewCache, fetch_session, page_budget  # noqa: E402
+from scheduler import Job, expand_jobs, output_stem, run_jobs  # noqa: E402
+from sinks import OutputSettings, output_settings  # noqa: E402
+
+LOGGER = get_logger("googleplay.scraper")
+
+
+def stream_key(package: str, lang: str, country: str) -> CheckpointKey:
+    """Checkpoint and cache key of the newest-first review stream of one app and locale."""
+    return (package, lang, country, Sort.NEWEST)
+
+
+def iter_review_pages(
+    app_id: str,
+    lang: str,
+    country: str,
+    count: int,
+    max_pages: int = 1,
+    stop_at_date: Optional[date] = None,
+    progress_interval: Optional[int] = None,
+    progress_label: str = "",
+    state: Optional[FetchState] = None,
+    on_page: Optional[PageCallback] = None,
+    keep_rows: bool = True,
+    governor: Optional[RequestGovernor] = None,
+) -> Iterator[List[Review]]:
+    """Yield newest-first review pages, continuing from ``state`` when one is given.
+
+    ``max_pages`` counts every page held by ``state``, so calling again with a
+    larger limit only downloads the pages that are still missing. With
+    ``keep_rows=False`` the pages are not collected in ``state.rows``.
+    """
+    if state is None:
+        state = FetchState()
+
+    while not state.exhausted and state.pages < max_pages:
+        if stop_at_date and state.oldest and state.oldest <= stop_at_date:
+            break
+
+        kwargs = {
+            "lang": lang,
+            "country": country,
+            "sort": Sort.NEWEST,
+            "count": count,
+        }
+        if state.continuation_token is not None:
+            # the token pins the page size of the request that issued it
+            if hasattr(state.continuation_token, "count"):
+                state.continuation_token.count = count
+            kwargs["continuation_token"] = state.continuation_token
+        requested = time.perf_counter()
+        if governor is not None:
+            result, continuation_token = governor.call(reviews, app_id, **kwargs)
+        else:
+            result, continuation_token = reviews(app_id, **kwargs)
+        METRICS.observe("page_fetch_seconds", time.perf_counter() - requested)
+
+        batch: List[Review] = []
+        for data in result:
+            row = review_from_gps(data)
+            if review_key(row) in state.boundary_keys:
+                continue
+            batch.append(row)
+        previous_total = state.total
+        if keep_rows:
+            state.rows.extend(batch)
+        state.total += len(batch)
+        state.pages += 1
+        METRICS.inc("pages_fetched_total")
+        METRICS.inc("reviews_fetched_total", len(batch))
+        state.continuation_token = continuation_token
+        state.exhausted = not has_more(continuation_token)
+        state.boundary_keys = {review_key(row) for row in batch}
+        state.note_times(batch)
+        batch_oldest = _oldest_date(batch)
+        if batch_oldest and (state.oldest is None or batch_oldest < state.oldest):
+            state.oldest = batch_oldest
+        total = state.total
+        if on_page:
+            on_page(state, batch)
+
+        if progress_interval and progress_interval > 0 and total // progress_interval != previous_total // progress_interval:
+            label = f"[{progress_label}] " if progress_label else ""
+            LOGGER.info("%sfetched %d reviews", label, total)
+
+        yield batch
+        if not result:
+            break
+
+
+def fetch_reviews(
+    app_id: str,
+    lang: str,
+    country: str,
+    count: int,
+    max_pages: int = 1,
+    stop_at_date: Optional[date] = None,
+    progress_interval: Optional[int] = None,
+    progress_label: str = "",
+    state: Optional[FetchState] = None,
+    on_page: Optional[PageCallback] = None,
+    keep_rows: bool = True,
+    governor: Optional[RequestGovernor] = None,
+) -> List[Review]:
+    if state is None:
+        state = FetchState()
+    for _ in iter_review_pages(
+        app_id,
+        lang,
+        country,
+        count,
+        max_pages=max_pages,
+        stop_at_date=stop_at_date,
+        progress_interval=progress_interval,
+        progress_label=progress_label,
+        state=state,
+        on_page=on_page,
+        keep_rows=keep_rows,
+        governor=governor,
+    ):
+        pass
+    return state.rows
+
+
+def _oldest_date(rows: List[Review]) -> Optional[date]:
+    oldest: Optional[date] = None
+    for row in rows:
+        comment_date = row.day
+        if comment_date is None:
+            continue
+        if oldest is None or comment_date < oldest:
+            oldest = comment_date
+    return oldest
+
+
+def iter_backfill_pages(
+    package: str,
+    lang: str,
+    country: str,
+    count: int,
+    stop_at: date,
+    max_pages: Optional[int],
+    auto_start: int,
+    auto_multiplier: float,
+    auto_cap: int,
+    auto_count_start: int,
+    auto_count_multiplier: float,
+    auto_count_cap: int,
+    progress_interval: int,
+    progress_label: str,
+    state: Optional[FetchState] = None,
+    on_page: Optional[PageCallback] = None,
+    keep_rows: bool = True,
+    governor: Optional[RequestGovernor] = None,
+    planner: Optional[DensityPlanner] = None,
+) -> Iterator[List[Review]]:
+    """Yield pages until the stream reaches ``stop_at``, growing the page budget as needed.
+
+    A fixed ``max_pages`` is fetched as is. Otherwise ``planner`` sizes the
+    requests from the observed review density, or, without one, the page
+    count and page size grow geometrically up to their caps.
+    """
+    # pages fetched by earlier attempts are kept; each retry resumes from the last token
+    if state is None:
+        state = FetchState()
+
+    def pages_up_to(count_current: int, pages: int) -> Iterator[List[Review]]:
+        return iter_review_pages(
+            package,
+            lang,
+            country,
+            count_current,
+            max_pages=pages,
+            stop_at_date=stop_at,
+            progress_interval=progress_interval,
+            progress_label=progress_label if max_pages is not None else f"{progress_label}-p{pages}",
+            state=state,
+            on_page=on_page,
+            keep_rows=keep_rows,
+            governor=governor,
+        )
+
+    def reached(count_current: int) -> bool:
+        oldest = state.oldest
+        if not oldest:
+            LOGGER.warning("No dated reviews returned after %d pages with %d reviews per page", state.pages, count_current)
+            return True
+        if oldest <= stop_at:
+            return True
+        if state.exhausted:
+            LOGGER.warning("No more reviews available; the earliest review only goes back to %s (target date %s)", oldest, stop_at)
+            return True
+        return False
+
+    if max_pages is not None:
+        yield from pages_up_to(count, max_pages)
+        return
+
+    if planner is not None:
+        page_cap = max(1, auto_cap)
+        while True:
+            count_current, pages = planner.plan(state, stop_at)
+            pages = min(page_cap, pages)
+            if pages <= state.pages:
+                LOGGER.warning(
+                    "Even after %d pages the target date %s was not reached (earliest review only goes back to %s)",
+                    state.pages,
+                    stop_at,
+                    state.oldest,
+                )
+                return
+            rate = planner.rate(state)
+            LOGGER.info(
+                "Planning %d more pages of %d reviews to reach %s (%s reviews/day).",
+                pages - state.pages,
+                count_current,
+                stop_at,
+                f"{rate:.0f}" if rate is not None else "unknown",
+            )
+            yield from pages_up_to(count_current, pages)
+            if reached(count_current):
+                return
+
+    pages = max(1, auto_start, state.pages + 1 if state.pages else 0)
+    multiplier = auto_multiplier if auto_multiplier > 1 else 2.0
+    cap = max(pages, auto_cap)
+    count_current = max(1, auto_count_start, count)
+    count_mul = auto_count_multiplier if auto_count_multiplier > 1 else 2.0
+    count_cap = max(count_current, auto_count_cap)
+
+    while True:
+        LOGGER.info("Attempting to fetch up to %d pages, %d reviews per page, covering %s.", pages, count_current, stop_at)
+        yield from pages_up_to(count_current, pages)
+        if reached(count_current):
+            return
+        oldest = state.oldest
+        if count_current < count_cap:
+            new_count = min(count_cap, int(max(count_current * count_mul, count_current + 1)))
+            if new_count > count_current:
+                LOGGER.info("Earliest review %s is later than target date %s; increasing per-request count to %d.", oldest, stop_at, new_count)
+                count_current = new_count
+                # already fetched pages are kept, so the larger pages come on top of them
+                pages = min(cap, max(pages, state.pages + 1))
+                continue
+        new_pages = min(cap, int(max(pages * multiplier, pages + 1)))
+        if new_pages == pages:
+            LOGGER.warning(
+                "Even after auto-pagination up to the limit of %d pages, the target date %s was not reached (earliest review only goes back to %s)",
+                pages,
+                stop_at,
+                oldest,
+            )
+            return
+        pages = new_pages
+        LOGGER.info("Earliest review %s is later than target date %s; expanding the number of pages to %d", oldest, stop_at, pages)
+
+
+def iter_pages_since(pages: Iterable[List[Review]], mark: Optional[Watermark]) -> Iterator[List[Review]]:
+    """Cut newest-first ``pages`` at ``mark``: yield only unseen rows and stop after the page that reaches it."""
+    for batch in pages:
+        if mark is None:
+            yield batch
+            continue
+        fresh = [row for row in batch if mark.is_new(row)]
+        yield fresh
+        if len(fresh) < len(batch):
+            return
+
+
+def remember_density(checkpoints: Optional[CheckpointStore], package: str, lang: str, country: str, state: FetchState) -> None:
+    """Store the reviews-per-day rate the fetch observed, for the planner of later runs."""
+    rate = DensityPlanner.observed_rate(state)
+    if checkpoints is not None and rate is not None:
+        checkpoints.save_density(package, lang, country, rate)
+
+
+def run_single(
+    app_cfg: Dict,
+    base_output: Path,
+    lang: str,
+    country: str,
+    checkpoints: Optional[CheckpointStore] = None,
+    resume: bool = False,
+    cache: Optional[ReviewCache] = None,
+    outputs: OutputSettings = OutputSettings(),
+    governor: Optional[RequestGovernor] = None,
+    default_count: int = 1000,
+) -> None:
+    """``single`` mode: the newest ``count`` x ``max_pages`` reviews into one file."""
+    count = int(app_cfg.get("count", default_count))
+    max_pages = int(app_cfg.get("max_pages", 1))
+    progress_interval = int(app_cfg.get("progress_interval", 0))
+    package = app_cfg["package"]
+    stem = output_stem(app_cfg, lang, country)
+    with fetch_session(stream_key(package, lang, country), count, f"{stem}-single", checkpoints, cache, resume) as (state, on_page):
+        pages = iter_review_pages(
+            package,
+            lang,
+            country,
+            count,
+            max_pages=page_budget(state, count, max_pages),
+            progress_interval=progress_interval,
+            progress_label=f"{stem}-single",
+            state=state,
+            on_page=on_page,
+            governor=governor,
+        )
+        sink = outputs.job_sink(
+            package,
+            lambda _: ensure_subdir(base_output, "single") / f"{stem}_single.csv",
+            outputs.parquet_dataset(base_output, package, "single", lang, country),
+            label_for=lambda _: "all",
+        )
+        # a cached stream may already hold more than this entry asked for
+        Pipeline(collected(state, pages), sink, [lambda rows: rows[: count * max_pages]], as_one("all")).run()
+
+
+def play_governor(config: Dict) -> RequestGovernor:
+    """The request governor for ``config``, retrying the scraper's transient errors."""
+    return governor_from_config(config, retry_on=(GooglePlayScraperException, OSError), give_up_on=(NotFoundError,))
+
+
+JobHandler = Callable[..., None]
+
+
+def run_config(config: Dict, root: Path, default_mode: str, handlers: Dict[str, JobHandler], resume: bool = False) -> None:
+    """Run every job of ``config`` with the handler registered for its mode.
+
+    The jobs share one checkpoint store, review cache, request governor and
+    set of output settings. Handlers are called as
+    ``handler(app_cfg, output_dir, lang, country, checkpoints=, resume=, cache=, outputs=, governor=)``.
+    """
+    output_dir = root / config.get("output_dir", "output")
+    ensure_output_dir(output_dir)
+    checkpoint_db = config.get("checkpoint_db")
+    checkpoints = CheckpointStore(root / checkpoint_db if checkpoint_db else output_dir / "checkpoints.sqlite")
+    cache = ReviewCache(
+        max_entries=int(config.get("cache_max_entries", 8)),
+        max_rows=int(config.get("cache_max_rows", 2_000_000)),
+        on_evict=checkpoints.clear,
+    )
+    outputs = output_settings(config, root)
+    governor = play_governor(config)
+    metrics_textfile = config.get("metrics_textfile")
+
+    def run_job(job: Job) -> None:
+        handler = handlers.get(job.mode)
+        if handler is None:
+            LOGGER.warning("Unknown mode %s; skipping %s", job.mode, job.package)
+            return
+        handler(
+            job.app_cfg,
+            output_dir,
+            job.lang,
+            job.country,
+            checkpoints=checkpoints,
+            resume=resume,
+            cache=cache,
+            outputs=outputs,
+            governor=governor,
+        )
+
+    METRICS.reset()
+    success = False
+    try:
+        run_jobs(expand_jobs(config, default_mode), run_job, workers=int(config.get("workers", 1)))
+        success = True
+    finally:
+        cache.clear()
+        checkpoints.close()
+        report_run(success, root / metrics_textfile if metrics_textfile else None)
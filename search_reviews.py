@@ -0,0 +1,112 @@
+import argparse
+import sqlite3
+from datetime import date, datetime, timedelta
+from typing import List, NamedTuple, Optional
+
+
+class SearchHit(NamedTuple):
+    review_id: int
+    app_name: str
+    rating: Optional[int]
+    review_date: Optional[str]
+    snippet: str
+    score: float
+
+
+def build_match(query: str, phrase: bool = False, any_term: bool = False) -> str:
+    """Turn user input into an FTS5 query; every term is quoted so punctuation cannot break the syntax."""
+    if phrase:
+        return '"' + query.replace('"', '""') + '"'
+    terms = ['"' + term.replace('"', '""') + '"' for term in query.split()]
+    return (" OR " if any_term else " ").join(terms)
+
+
+def search(
+    conn: sqlite3.Connection,
+    query: str,
+    app: Optional[str] = None,
+    min_rating: Optional[int] = None,
+    max_rating: Optional[int] = None,
+    since: Optional[date] = None,
+    until: Optional[date] = None,
+    limit: int = 20,
+    phrase: bool = False,
+    any_term: bool = False,
+) -> List[SearchHit]:
+    """Reviews matching ``query`` best first (bm25), optionally filtered by app, rating and date range."""
+    where = ["reviews_fts MATCH ?"]
+    params: list = [build_match(query, phrase, any_term)]
+    if app is not None:
+        where.append("a.app_name = ?")
+        params.append(app)
+    if min_rating is not None:
+        where.append("r.rating >= ?")
+        params.append(min_rating)
+    if max_rating is not None:
+        where.append("r.rating <= ?")
+        params.append(max_rating)
+    if since is not None:
+        where.append("r.review_date >= ?")
+        params.append(f"{since:%Y-%m-%d}")
+    if until is not None:
+        # review_date holds a time of day, so the bound is the start of the next day
+        where.append("r.review_date < ?")
+        params.append(f"{until + timedelta(days=1):%Y-%m-%d}")
+    params.append(limit)
+    rows = conn.execute(
+        f"""
+        SELECT r.review_id, a.app_name, r.rating, r.review_date,
+               snippet(reviews_fts, 0, '[', ']', '...', 16), bm25(reviews_fts)
+        FROM reviews_fts
+        JOIN reviews r ON r.review_id = reviews_fts.rowid
+        JOIN apps a ON a.app_id = r.app_id
+        WHERE {' AND '.join(where)}
+        ORDER BY bm25(reviews_fts)
+        LIMIT ?;
+        """,
+        params,
+    ).fetchall()
+    return [SearchHit(*row) for row in rows]
+
+
+def parse_date(value: str) -> date:
+    return datetime.strptime(value, "%Y-%m-%d").date()
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Ranked full-text search over reviews.db")
+    parser.add_argument("query", help='Keywords (all must match), or a phrase with --phrase, e.g. "voice mode"')
+    parser.add_argument("--db", default="reviews.db", help="SQLite database (default: reviews.db)")
+    parser.add_argument("--app", help="Only reviews of this package name")
+    parser.add_argument("--min-rating", type=int, help="Lowest star rating to include")
+    parser.add_argument("--max-rating", type=int, help="Highest star rating to include")
+    parser.add_argument("--since", type=parse_date, help="First review date to include (YYYY-MM-DD)")
+    parser.add_argument("--until", type=parse_date, help="Last review date to include (YYYY-MM-DD)")
+    parser.add_argument("--limit", type=int, default=20, help="Number of results (default: 20)")
+    parser.add_argument("--phrase", action="store_true", help="Match the query as one exact phrase")
+    parser.add_argument("--any", dest="any_term", action="store_true", help="Match reviews containing any of the keywords")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    conn = sqlite3.connect(args.db)
+    hits = search(
+        conn,
+        args.query,
+        app=args.app,
+        min_rating=args.min_rating,
+        max_rating=args.max_rating,
+        since=args.since,
+        until=args.until,
+        limit=args.limit,
+        phrase=args.phrase,
+        any_term=args.any_term,
+    )
+    for hit in hits:
+        print(f"#{hit.review_id} {hit.app_name} {hit.rating}* {hit.review_date}: {hit.snippet}")
+    print(f"{len(hits)} results")
+    conn.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,525 @@
+"""Output sinks that consume review pages as they are fetched."""
+from __future__ import annotations
+
+import csv
+import os
+import sqlite3
+from bisect import bisect_right
+from collections import OrderedDict
+from datetime import date
+from pathlib import Path
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Set, TextIO, Tuple
+
+from logging_utils import get_logger
+from metrics import METRICS
+from near_duplicates import AVAILABLE as NEAR_DUPLICATES_AVAILABLE, NearDuplicateIndex
+from merge_reviews import iter_csv_rows
+from records import REVIEW_FIELDS, Review, review_digest, row_digest
+from review_db import connect_database, content_hash, insert_reviews, resolve_app_id, text_length
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # only needed for output_format "parquet"
+    pa = pq = None
+
+LOGGER = get_logger("googleplay.sinks")
+
+
+Period = Tuple[date, date]
+
+
+def period_label(period: Period) -> str:
+    return f"{period[0]:%Y%m%d}-{period[1]:%Y%m%d}"
+
+
+def _period_index(starts: List[date], periods: List[Period], row: Review) -> int:
+    """Index of the period containing ``row``, or -1 when it falls outside all of them."""
+    comment_date = row.day
+    if comment_date is None:
+        return -1
+    index = bisect_right(starts, comment_date) - 1
+    if index >= 0 and comment_date <= periods[index][1]:
+        return index
+    return -1
+
+
+def write_csv_file(rows: List[Review], output_path: Path) -> int:
+    """Write ``rows`` with a header, or a single ``empty`` line when there are none; return the file size."""
+    with output_path.open("w", encoding="utf-8-sig", newline="") as f:
+        writer = csv.writer(f)
+        if rows:
+            writer.writerow(REVIEW_FIELDS)
+            writer.writerows(rows)
+        else:
+            writer.writerow(["empty"])
+    return output_path.stat().st_size
+
+
+def note_csv_written(output_path: Path, size: int, rows: int) -> None:
+    METRICS.inc("csv_files_written_total")
+    METRICS.inc("csv_bytes_written_total", size)
+    if rows:
+        LOGGER.info("created %s", output_path, extra={"bytes": size, "rows": rows})
+    else:
+        LOGGER.warning("%s No reviews found; an empty file was created", output_path)
+
+
+def save_to_csv(rows: List[Review], output_path: Path) -> None:
+    with METRICS.timer("write_csv"):
+        size = write_csv_file(rows, output_path)
+    note_csv_written(output_path, size, len(rows))
+
+
+def merge_into_csv(rows: List[Review], output_path: Path) -> None:
+    """Put newest-first ``rows`` in front of the rows ``output_path`` already holds, skipping reviews it has.
+
+    The file is rewritten through a temporary file, so an interrupted merge
+    leaves the previous version in place.
+    """
+    existing = list(iter_csv_rows(output_path)) if output_path.exists() else []
+    if not existing:
+        save_to_csv(rows, output_path)
+        return
+    known = {review_digest(name, at, content) for name, content, _, at, _ in existing}
+    fresh = [row for row in rows if row_digest(row) not in known]
+    if not fresh:
+        LOGGER.info("%s is up to date", output_path)
+        return
+    partial = output_path.with_name(output_path.name + ".part")
+    with METRICS.timer("write_csv"), partial.open("w", encoding="utf-8-sig", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(REVIEW_FIELDS)
+        writer.writerows(fresh)
+        writer.writerows(existing)
+    os.replace(partial, output_path)
+    size = output_path.stat().st_size
+    METRICS.inc("csv_files_written_total")
+    METRICS.inc("csv_bytes_written_total", size)
+    LOGGER.info("merged %d new reviews into %s", len(fresh), output_path, extra={"bytes": size, "rows": len(fresh) + len(existing)})
+
+
+class PeriodCsvSink:
+    """Route each fetched row to its period's CSV, keeping at most ``max_open`` files open.
+
+    The files match what ``save_to_csv`` writes for the same rows: a header
+    row, or a single ``empty`` line for periods that received nothing.
+    """
+
+    def __init__(self, periods: List[Period], path_for: Callable[[Period], Path], max_open: int = 32) -> None:
+        self.periods = periods
+        self.path_for = path_for
+        self.max_open = max(1, max_open)
+        self._starts = [period_start for period_start, _ in periods]
+        self._open: "OrderedDict[int, Tuple[TextIO, Any]]" = OrderedDict()
+        self._started: Set[int] = set()
+
+    def write(self, rows: List[Review]) -> None:
+        with METRICS.timer("write_csv"):
+            for row in rows:
+                index = _period_index(self._starts, self.periods, row)
+                if index >= 0:
+                    self._writer(index).writerow(row)
+
+    def _writer(self, index: int) -> Any:
+        if index in self._open:
+            self._open.move_to_end(index)
+            return self._open[index][1]
+        if len(self._open) >= self.max_open:
+            _, (handle, _) = self._open.popitem(last=False)
+            handle.close()
+        # reopened files are appended to; the BOM and header are only written once
+        mode = "a" if index in self._started else "w"
+        handle = self.path_for(self.periods[index]).open(mode, encoding="utf-8-sig", newline="")
+        writer = csv.writer(handle)
+        if index not in self._started:
+            writer.writerow(REVIEW_FIELDS)
+            self._started.add(index)
+        self._open[index] = (handle, writer)
+        return writer
+
+    def abort(self) -> None:
+        """Close open files without writing placeholders for the missing periods."""
+        for handle, _ in self._open.values():
+            handle.close()
+        self._open.clear()
+
+    def close(self) -> None:
+        self.abort()
+        for index, period in enumerate(self.periods):
+            output_path = self.path_for(period)
+            if index not in self._started:
+                with output_path.open("w", encoding="utf-8-sig", newline="") as f:
+                    csv.writer(f).writerow(["empty"])
+            size = output_path.stat().st_size
+            METRICS.inc("csv_files_written_total")
+            METRICS.inc("csv_bytes_written_total", size)
+            if index in self._started:
+                LOGGER.info("created %s", output_path, extra={"bytes": size})
+            else:
+                LOGGER.warning("%s No reviews found; an empty file was created", output_path)
+
+
+def parquet_schema() -> "pa.Schema":
+    return pa.schema(
+        [
+            ("name", pa.string()),
+            ("content", pa.string()),
+            ("score", pa.int8()),
+            ("at", pa.timestamp("us")),
+            ("appversion", pa.dictionary(pa.int32(), pa.string())),
+        ]
+    )
+
+
+def reviews_table(rows: List[Review]) -> "pa.Table":
+    """Column-wise Arrow table of ``rows`` with the types of ``parquet_schema``."""
+    schema = parquet_schema()
+    columns = list(zip(*rows)) if rows else [() for _ in REVIEW_FIELDS]
+    return pa.Table.from_arrays(
+        [pa.array(column, type=field.type) for column, field in zip(columns, schema)],
+        schema=schema,
+    )
+
+
+class ParquetDataset:
+    """Hive-partitioned review files: ``<root>/package=<package>/frequency=<frequency>/period=<period>/``.
+
+    Every locale writes its own ``<lang>-<country>-<n>.parquet`` parts inside a
+    partition. The parts a locale left there in earlier runs are removed the
+    first time the partition is written again, so a re-run replaces its period
+    the way the CSV files are overwritten.
+    """
+
+    def __init__(self, root: Path, package: str, frequency: str, locale: str) -> None:
+        self.root = root
+        self.package = package
+        self.frequency = frequency
+        self.locale = locale
+        self._parts: Dict[str, int] = {}
+
+    def partition_dir(self, label: str) -> Path:
+        return self.root / f"package={self.package}" / f"frequency={self.frequency}" / f"period={label}"
+
+    def next_part(self, label: str) -> Path:
+        """Path of the partition's next part, clearing the locale's stale parts on first use."""
+        directory = self.partition_dir(label)
+        if label not in self._parts:
+            directory.mkdir(parents=True, exist_ok=True)
+            for stale in directory.glob(f"{self.locale}-*.parquet"):
+                stale.unlink()
+            self._parts[label] = 0
+        path = directory / f"{self.locale}-{self._parts[label]}.parquet"
+        self._parts[label] += 1
+        return path
+
+    def write(self, label: str, rows: List[Review]) -> Path:
+        path = self.next_part(label)
+        with METRICS.timer("write_parquet"):
+            pq.write_table(reviews_table(rows), path, compression="zstd")
+        METRICS.inc("parquet_files_written_total")
+        METRICS.inc("parquet_bytes_written_total", path.stat().st_size)
+        return path
+
+    def append(self, label: str, rows: List[Review]) -> Optional[Path]:
+        """Add ``rows`` to a partition as one more part, keeping the parts earlier runs wrote."""
+        if not rows:
+            return None
+        if label not in self._parts:
+            directory = self.partition_dir(label)
+            numbers = [int(path.stem.rsplit("-", 1)[1]) for path in directory.glob(f"{self.locale}-*.parquet")]
+            if numbers:
+                self._parts[label] = max(numbers) + 1
+        path = self.write(label, rows)
+        LOGGER.info("appended %s", path, extra={"rows": len(rows)})
+        return path
+
+    def write_period(self, label: str, rows: List[Review]) -> None:
+        """Write one period's rows; an empty period still gets a file with the schema."""
+        path = self.write(label, rows)
+        if rows:
+            LOGGER.info("created %s", path, extra={"rows": len(rows)})
+        else:
+            LOGGER.warning("%s No reviews found; an empty file was created", path)
+
+
+class PeriodParquetSink:
+    """Route fetched rows to their period's partition, writing a part once ``part_rows`` are buffered.
+
+    At most ``max_buffered`` rows are held across all periods; past that the
+    largest buffer is written out early.
+    """
+
+    def __init__(self, periods: List[Period], dataset: ParquetDataset, part_rows: int = 100_000, max_buffered: int = 500_000) -> None:
+        self.periods = periods
+        self.dataset = dataset
+        self.part_rows = max(1, part_rows)
+        self.max_buffered = max(self.part_rows, max_buffered)
+        self._starts = [period_start for period_start, _ in periods]
+        self._buffers: Dict[int, List[Review]] = {}
+        self._buffered = 0
+        self._written: Set[int] = set()
+
+    def write(self, rows: List[Review]) -> None:
+        for row in rows:
+            index = _period_index(self._starts, self.periods, row)
+            if index < 0:
+                continue
+            buffer = self._buffers.setdefault(index, [])
+            buffer.append(row)
+            self._buffered += 1
+            if len(buffer) >= self.part_rows:
+                self._flush(index)
+        if self._buffered > self.max_buffered:
+            self._flush(max(self._buffers, key=lambda index: len(self._buffers[index])))
+
+    def _flush(self, index: int) -> None:
+        rows = self._buffers.pop(index, [])
+        if rows:
+            self._buffered -= len(rows)
+            self.dataset.write(period_label(self.periods[index]), rows)
+            self._written.add(index)
+
+    def abort(self) -> None:
+        self._buffers.clear()
+        self._buffered = 0
+
+    def close(self) -> None:
+        for index in list(self._buffers):
+            self._flush(index)
+        for index, period in enumerate(self.periods):
+            if index in self._written:
+                LOGGER.info("created %s", self.dataset.partition_dir(period_label(period)))
+            else:
+                self.dataset.write_period(period_label(period), [])
+
+
+class SqliteReviewSink:
+    """Insert fetched rows into the ``reviews`` table in batched transactions.
+
+    ``year_month``, ``text_length`` and ``content_hash`` are derived here, so
+    no CSV round trip through ``load_reviews.py`` is needed. Reviews already
+    in the table are skipped, which makes re-runs and resumed jobs safe.
+    With ``cluster_duplicates`` every batch is labelled with near-duplicate
+    cluster ids before it is inserted. A ``prepared`` sink takes tuples
+    already in ``REVIEW_COLUMNS`` order, as ``load_reviews.prepare_chunk``
+    builds them, instead of ``Review`` records.
+    """
+
+    def __init__(
+        self,
+        path: Path,
+        package: Optional[str],
+        batch_size: int = 5000,
+        cluster_duplicates: bool = False,
+        app_id: Optional[int] = None,
+        prepared: bool = False,
+    ) -> None:
+        self.path = path
+        self.prepared = prepared
+        self.batch_size = max(1, batch_size)
+        self.inserted = 0
+        self.skipped = 0
+        self._conn = connect_database(path)
+        self.app_id = resolve_app_id(self._conn, package) if package is not None else app_id
+        self._clusters = NearDuplicateIndex(self._conn, self.app_id) if cluster_duplicates else None
+        self._pending: List[Tuple] = []
+
+    @property
+    def connection(self) -> sqlite3.Connection:
+        return self._conn
+
+    def write(self, rows: List[Review]) -> None:
+        if self.prepared:
+            for record in rows:
+                self._pending.append(record)
+                if len(self._pending) >= self.batch_size:
+                    self.flush()
+            return
+        for row in rows:
+            at = row.at
+            self._pending.append(
+                (
+                    self.app_id,
+                    row.name,
+                    row.score,
+                    row.content,
+                    str(at) if at is not None else None,
+                    f"{at:%Y-%m}" if at is not None else None,
+                    row.appversion,
+                    text_length(row.content),
+                    content_hash(row.content),
+                    None,
+                )
+            )
+            if len(self._pending) >= self.batch_size:
+                self.flush()
+
+    def flush(self) -> None:
+        if not self._pending:
+            return
+        with METRICS.timer("write_db"):
+            inserted = insert_reviews(self._conn, self._pending, self._clusters.label if self._clusters else None)
+        METRICS.inc("db_rows_inserted_total", inserted)
+        METRICS.inc("db_rows_skipped_total", len(self._pending) - inserted)
+        self.inserted += inserted
+        self.skipped += len(self._pending) - inserted
+        self._pending = []
+
+    def abort(self) -> None:
+        self._pending = []
+        self._conn.close()
+
+    def close(self) -> None:
+        self.flush()
+        self._conn.close()
+        LOGGER.info("inserted %d reviews into %s (%d already stored)", self.inserted, self.path, self.skipped)
+
+
+class JobSink:
+    """Fan one job's rows out to its CSV files, Parquet partitions and review database.
+
+    ``write_period`` stores one whole period (``save_to_csv`` and
+    ``ParquetDataset.write_period``), or with ``merge`` adds the rows to what
+    the period already holds (``merge_into_csv`` and ``ParquetDataset.append``).
+    ``write`` takes rows of any period, in any order, and routes them through
+    ``PeriodCsvSink``/``PeriodParquetSink``, which needs ``periods``. With an
+    ``exporter`` (``parallel_export.PeriodExporter``) whole periods are written
+    by worker processes while the database is filled here; their aggregates
+    are kept in ``period_stats`` once the sink is closed.
+    """
+
+    def __init__(
+        self,
+        database: Optional[SqliteReviewSink] = None,
+        csv_path: Optional[Callable[[Any], Path]] = None,
+        dataset: Optional[ParquetDataset] = None,
+        periods: Optional[List[Period]] = None,
+        label_for: Callable[[Any], str] = period_label,
+        max_open_files: int = 32,
+        merge: bool = False,
+        exporter: Optional[Any] = None,
+    ) -> None:
+        self.database = database
+        self.csv_path = csv_path
+        self.dataset = dataset
+        self.label_for = label_for
+        self.merge = merge
+        self.exporter = exporter
+        self.period_stats: List[Any] = []
+        self._streams: List[Any] = []
+        if periods is not None:
+            if csv_path is not None:
+                self._streams.append(PeriodCsvSink(periods, csv_path, max_open=max_open_files))
+            if dataset is not None:
+                self._streams.append(PeriodParquetSink(periods, dataset))
+
+    def write(self, rows: List[Review]) -> None:
+        for stream in self._streams:
+            stream.write(rows)
+        if self.database is not None:
+            self.database.write(rows)
+
+    def write_period(self, period: Any, rows: List[Review]) -> None:
+        if self.exporter is not None and not self.merge:
+            label = self.label_for(period)
+            csv_path = self.csv_path(period) if self.csv_path is not None else None
+            parquet_path = self.dataset.next_part(label) if self.dataset is not None else None
+            self.exporter.submit(label, rows, csv_path, parquet_path)
+            if self.database is not None:
+                self.database.write(rows)
+            return
+        if self.csv_path is not None:
+            (merge_into_csv if self.merge else save_to_csv)(rows, self.csv_path(period))
+        if self.dataset is not None:
+            if self.merge and self.dataset.partition_dir(self.label_for(period)).exists():
+                self.dataset.append(self.label_for(period), rows)
+            else:
+                self.dataset.write_period(self.label_for(period), rows)
+        if self.database is not None:
+            self.database.write(rows)
+
+    def abort(self) -> None:
+        if self.exporter is not None:
+            self.exporter.abort()
+        for stream in self._streams:
+            stream.abort()
+        if self.database is not None:
+            self.database.abort()
+
+    def close(self) -> None:
+        if self.exporter is not None:
+            self.period_stats = self.exporter.close()
+        for stream in self._streams:
+            stream.close()
+        if self.database is not None:
+            self.database.close()
+
+
+class OutputSettings(NamedTuple):
+    """Where a run writes its rows: per-period CSV and/or Parquet files, the review database, or both."""
+
+    write_csv: bool = True
+    database: Optional[Path] = None
+    batch_size: int = 5000
+    write_parquet: bool = False
+    cluster_duplicates: bool = False
+    export_workers: int = 1
+
+    def parquet_dataset(self, base_output: Path, package: str, frequency: str, lang: str, country: str) -> Optional[ParquetDataset]:
+        if not self.write_parquet:
+            return None
+        return ParquetDataset(base_output / "parquet", package, frequency, f"{lang}-{country}")
+
+    def database_sink(self, package: str) -> Optional[SqliteReviewSink]:
+        if self.database is None:
+            return None
+        return SqliteReviewSink(self.database, package, self.batch_size, self.cluster_duplicates)
+
+    def job_sink(
+        self,
+        package: str,
+        csv_path: Callable[[Any], Path],
+        dataset: Optional[ParquetDataset] = None,
+        periods: Optional[List[Period]] = None,
+        label_for: Callable[[Any], str] = period_label,
+        max_open_files: int = 32,
+        include_database: bool = True,
+        merge: bool = False,
+        exporter: Optional[Any] = None,
+    ) -> JobSink:
+        """The job's sink; ``periods`` makes it a streaming sink (see ``JobSink``)."""
+        return JobSink(
+            self.database_sink(package) if include_database else None,
+            csv_path if self.write_csv else None,
+            dataset,
+            periods,
+            label_for,
+            max_open_files,
+            merge,
+            exporter,
+        )
+
+
+def output_settings(config: Dict, root: Path) -> OutputSettings:
+    sink = config.get("sink", "csv")
+    if sink not in ("csv", "sqlite", "both"):
+        raise ValueError(f"unsupported sink: {sink}")
+    output_format = config.get("output_format", "csv")
+    if output_format not in ("csv", "parquet", "both"):
+        raise ValueError(f"unsupported output_format: {output_format}")
+    if output_format != "csv" and pa is None:
+        raise RuntimeError("output_format %r needs pyarrow; install it with `pip install pyarrow`" % output_format)
+    database = root / config.get("database", "reviews.db") if sink in ("sqlite", "both") else None
+    cluster_duplicates = bool(config.get("near_duplicates", False)) and database is not None
+    if cluster_duplicates and not NEAR_DUPLICATES_AVAILABLE:
+        raise RuntimeError("near_duplicates needs numpy; install it with `pip install numpy`")
+    write_files = sink in ("csv", "both")
+    return OutputSettings(
+        write_csv=write_files and output_format in ("csv", "both"),
+        database=database,
+        batch_size=int(config.get("db_batch_size", 5000)),
+        write_parquet=write_files and output_format in ("parquet", "both"),
+        cluster_duplicates=cluster_duplicates,
+        export_workers=max(1, int(config.get("export_workers", 1))),
+    )
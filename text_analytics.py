@@ -0,0 +1,156 @@
+"""Term-frequency tables for review text, built in a single streaming pass.
+
+Every review is cleaned and tokenized once and counted into one cell keyed
+by (score bucket, month). The overall, per-bucket and per-month tables are
+sums of those cells, so memory grows with the vocabulary and the number of
+months, not with the number of reviews.
+
+    tf = term_frequencies(iter_csv_reviews(Path("output/merged_chatgpt_weekly.csv")))
+    tf.most_common(20)
+    tf.most_common(10, bucket="low")
+    tf.most_common(10, month="2025-08")
+"""
+from __future__ import annotations
+
+import csv
+import re
+import sys
+from collections import Counter, defaultdict
+from datetime import date
+from pathlib import Path
+from typing import Dict, FrozenSet, Iterable, Iterator, List, Optional, Tuple
+
+# same cleaning as the data_overview notebook: lowercase, drop everything but a-z and whitespace
+_NON_LETTERS = re.compile(r"[^a-z\s]+")
+
+# NLTK's English stopword list, used when the NLTK corpus is not installed
+ENGLISH_STOP_WORDS: FrozenSet[str] = frozenset(
+    """
+    a about above after again against ain all am an and any are aren aren't as at be because been before being
+    below between both but by can couldn couldn't d did didn didn't do does doesn doesn't doing don don't down
+    during each few for from further had hadn hadn't has hasn hasn't have haven haven't having he he'd he'll he's
+    her here hers herself him himself his how i i'd i'll i'm i've if in into is isn isn't it it'd it'll it's its
+    itself just ll m ma me mightn mightn't more most mustn mustn't my myself needn needn't no nor not now o of off
+    on once only or other our ours ourselves out over own re s same shan shan't she she'd she'll she's should
+    should've shouldn shouldn't so some such t than that that'll the their theirs them themselves then there
+    these they they'd they'll they're they've this those through to too under until up ve very was wasn wasn't
+    we we'd we'll we're we've were weren weren't what when where which while who whom why will with won won't
+    wouldn wouldn't y you you'd you'll you're you've your yours yourself yourselves
+    """.split()
+)
+
+BUCKETS = ("low", "neutral", "high")
+
+Cell = Tuple[str, str]
+
+
+def default_stop_words() -> FrozenSet[str]:
+    """NLTK's English stopwords when the corpus is available, the bundled copy otherwise."""
+    try:
+        from nltk.corpus import stopwords
+
+        return frozenset(stopwords.words("english"))
+    except (ImportError, LookupError):
+        return ENGLISH_STOP_WORDS
+
+
+def score_bucket(score) -> Optional[str]:
+    """``low`` for 1-2 stars, ``neutral`` for 3, ``high`` for 4-5."""
+    try:
+        value = int(float(score))
+    except (TypeError, ValueError):
+        return None
+    if value <= 2:
+        return "low"
+    if value == 3:
+        return "neutral"
+    return "high"
+
+
+def review_month(at) -> Optional[str]:
+    if isinstance(at, date):
+        return f"{at:%Y-%m}"
+    if isinstance(at, str) and len(at) >= 7:
+        return at[:7]
+    return None
+
+
+def tokenize(text: str) -> List[str]:
+    return _NON_LETTERS.sub("", text.lower()).split()
+
+
+class TermFrequencies:
+    """Token counts per (score bucket, month) cell; reviews without a score or date use ``""``."""
+
+    def __init__(self, stop_words: Optional[FrozenSet[str]] = None) -> None:
+        self.stop_words = default_stop_words() if stop_words is None else frozenset(stop_words)
+        self.cells: Dict[Cell, Counter] = defaultdict(Counter)
+        self.documents: Counter = Counter()
+
+    def add(self, content, score=None, at=None) -> None:
+        if not isinstance(content, str) or not content:
+            return
+        cell = (score_bucket(score) or "", review_month(at) or "")
+        stop_words = self.stop_words
+        self.cells[cell].update(token for token in tokenize(content) if token not in stop_words)
+        self.documents[cell] += 1
+
+    def update(self, reviews: Iterable[Tuple]) -> "TermFrequencies":
+        """Count ``(content, score, at)`` tuples."""
+        add = self.add
+        for content, score, at in reviews:
+            add(content, score, at)
+        return self
+
+    def table(self, bucket: Optional[str] = None, month: Optional[str] = None) -> Counter:
+        """Counts over all cells matching ``bucket`` and ``month`` (None matches any)."""
+        total: Counter = Counter()
+        for (cell_bucket, cell_month), counts in self.cells.items():
+            if (bucket is None or cell_bucket == bucket) and (month is None or cell_month == month):
+                total.update(counts)
+        return total
+
+    @property
+    def overall(self) -> Counter:
+        return self.table()
+
+    @property
+    def by_bucket(self) -> Dict[str, Counter]:
+        return self._grouped(0)
+
+    @property
+    def by_month(self) -> Dict[str, Counter]:
+        return self._grouped(1)
+
+    def _grouped(self, position: int) -> Dict[str, Counter]:
+        grouped: Dict[str, Counter] = defaultdict(Counter)
+        for cell, counts in self.cells.items():
+            grouped[cell[position]].update(counts)
+        return dict(sorted(grouped.items()))
+
+    def most_common(self, n: int = 20, bucket: Optional[str] = None, month: Optional[str] = None) -> List[Tuple[str, int]]:
+        return self.table(bucket, month).most_common(n)
+
+    def to_frame(self, n: int = 20, by: str = "bucket"):
+        """Top ``n`` terms per bucket or month as a long pandas DataFrame (group, word, count)."""
+        import pandas as pd
+
+        groups = self.by_bucket if by == "bucket" else self.by_month
+        records = [(group, word, count) for group, counts in groups.items() for word, count in counts.most_common(n)]
+        return pd.DataFrame(records, columns=[by, "word", "count"])
+
+
+def iter_csv_reviews(path: Path) -> Iterator[Tuple[str, str, str]]:
+    """Stream ``(content, score, at)`` from a period or merged CSV without loading it."""
+    csv.field_size_limit(sys.maxsize)
+    with path.open("r", encoding="utf-8-sig", newline="") as f:
+        reader = csv.DictReader(f)
+        if reader.fieldnames is None or "content" not in reader.fieldnames:
+            return
+        for row in reader:
+            yield row["content"], row["score"], row["at"]
+
+
+def term_frequencies(reviews: Iterable[Tuple], stop_words: Optional[FrozenSet[str]] = None) -> TermFrequencies:
+    """Build the term-frequency tables from ``(content, score, at)`` tuples in one pass."""
+    return TermFrequencies(stop_words).update(reviews)